@@ -0,0 +1,337 @@
+import os
+import io
+import sys
+import json
+import gzip
+import time
+import random
+import shutil
+import struct
+import argparse
+import platform
+import tempfile
+import statistics
+import contextlib
+
+import structure_nbt
+import village_structure
+import mansion_structure
+import village_worldgen
+import village_tags
+from palette_cache import PaletteCache, PALETTE_CACHE
+from object_store import OBJECT_STORE, ObjectStore, PROFILES
+import themes
+from themes import VILLAGE_THEMES
+
+# -------------------------------
+# Synthetic vanilla-like inputs
+# -------------------------------
+# Block names the reskin maps actually touch, plus filler that they don't.
+_MAPPED_BLOCKS = [
+    "minecraft:oak_planks", "minecraft:oak_log", "minecraft:oak_stairs", "minecraft:oak_slab",
+    "minecraft:oak_fence", "minecraft:oak_door", "minecraft:cobblestone", "minecraft:stone_bricks",
+    "minecraft:dark_oak_planks", "minecraft:dark_oak_log", "minecraft:cobblestone_wall",
+]
+_FILLER_BLOCKS = [
+    "minecraft:air", "minecraft:dirt", "minecraft:grass_block", "minecraft:glass_pane",
+    "minecraft:white_bed", "minecraft:torch", "minecraft:crafting_table", "minecraft:water",
+]
+_PROPERTIES = [{}, {"facing": "north", "half": "bottom"}, {"axis": "y"}, {"type": "top"}]
+
+
+def _name(s):
+    data = s.encode("utf-8")
+    return struct.pack(">H", len(data)) + data
+
+
+def synthetic_structure(palette_size, block_count, rng):
+    """Uncompressed structure NBT with the same layout as vanilla templates."""
+    names = _MAPPED_BLOCKS + _FILLER_BLOCKS
+    out = [b"\x0a", _name("")]
+
+    # size: list of 3 ints
+    out += [b"\x09", _name("size"), b"\x03", struct.pack(">i", 3), struct.pack(">3i", 16, 16, 16)]
+
+    # entities: empty list
+    out += [b"\x09", _name("entities"), b"\x00", struct.pack(">i", 0)]
+
+    # blocks: list of {pos: [x, y, z], state: int}
+    out += [b"\x09", _name("blocks"), b"\x0a", struct.pack(">i", block_count)]
+    for i in range(block_count):
+        out += [
+            b"\x09", _name("pos"), b"\x03", struct.pack(">i", 3),
+            struct.pack(">3i", i % 16, (i // 16) % 16, i // 256),
+            b"\x03", _name("state"), struct.pack(">i", rng.randrange(palette_size)),
+            b"\x00",
+        ]
+
+    # palette: list of {Name, Properties?}
+    out += [b"\x09", _name("palette"), b"\x0a", struct.pack(">i", palette_size)]
+    for i in range(palette_size):
+        out += [b"\x08", _name("Name"), _name(names[i % len(names)])]
+        props = _PROPERTIES[i % len(_PROPERTIES)]
+        if props:
+            out += [b"\x0a", _name("Properties")]
+            for key, value in props.items():
+                out += [b"\x08", _name(key), _name(value)]
+            out.append(b"\x00")
+        out.append(b"\x00")
+
+    out += [b"\x03", _name("DataVersion"), struct.pack(">i", 3953), b"\x00"]
+    return b"".join(out)
+
+
+def _write_nbt(path, raw):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(gzip.compress(raw, mtime=0))
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, indent=2)
+
+
+def _pool_json(base, category, elements, rng):
+    return {
+        "name": f"minecraft:village/{base}/{category}",
+        "fallback": "minecraft:empty",
+        "elements": [
+            {
+                "weight": rng.randint(1, 4),
+                "element": {
+                    "element_type": "minecraft:legacy_single_pool_element",
+                    "location": f"minecraft:village/{base}/{category}/{base}_{category}_{i}",
+                    "processors": f"minecraft:mossify_{rng.choice((10, 20, 70))}_percent",
+                    "projection": "rigid",
+                },
+            }
+            for i in range(elements)
+        ],
+    }
+
+
+def generate_inputs(root, files, palette_size, block_count, pool_files, pool_elements, seed=0):
+    """
+    Lay out a vanilla-like data/minecraft tree under `root`:
+    village structure NBTs per base, woodland mansion pieces, and the
+    worldgen structure / template_pool / structure_set / tag JSONs.
+    """
+    rng = random.Random(seed)
+    data = os.path.join(root, "data", "minecraft")
+    bases = sorted({mats["base"] for mats in VILLAGE_THEMES.values()})
+    categories = ["houses", "streets", "town_centers", "terminators", "villagers", "decor"]
+
+    for base in bases:
+        for i in range(files):
+            category = categories[i % 4]
+            raw = synthetic_structure(palette_size, block_count, rng)
+            _write_nbt(os.path.join(data, "structures", "village", base, category,
+                                    f"{base}_{category}_{i}.nbt"), raw)
+
+        _write_json(os.path.join(data, "worldgen", "structure", f"village_{base}.json"), {
+            "type": "minecraft:jigsaw",
+            "biomes": f"#minecraft:has_structure/village_{base}",
+            "start_pool": f"minecraft:village/{base}/town_centers",
+            "size": 6,
+        })
+        for i in range(pool_files):
+            category = categories[i % len(categories)]
+            sub = "zombie" if i >= len(categories) else ""
+            _write_json(os.path.join(data, "worldgen", "template_pool", "village", base, sub,
+                                     f"{category}_{i}.json"),
+                        _pool_json(base, category, pool_elements, rng))
+
+    for i in range(files):
+        raw = synthetic_structure(palette_size, block_count, rng)
+        _write_nbt(os.path.join(data, "structures", "woodland_mansion", f"piece_{i}.nbt"), raw)
+
+    _write_json(os.path.join(data, "worldgen", "structure_set", "villages.json"), {
+        "structures": [{"structure": f"minecraft:village_{base}", "weight": 1} for base in bases],
+        "placement": {"type": "minecraft:random_spread", "salt": 10387312, "spacing": 34, "separation": 8},
+    })
+    _write_json(os.path.join(data, "tags", "worldgen", "structure", "village.json"), {
+        "values": [f"minecraft:village_{base}" for base in bases],
+    })
+    return data
+
+# -------------------------------
+# Extra synthetic themes
+# -------------------------------
+@contextlib.contextmanager
+def extra_themes(count):
+    """Temporarily add `count` cloned themes to the shared theme registry."""
+    saved = dict(VILLAGE_THEMES)
+    source = list(saved.items())
+    for i in range(count):
+        theme, mats = source[i % len(source)]
+        VILLAGE_THEMES[f"bench{i}_{theme}"] = dict(mats)
+    try:
+        yield
+    finally:
+        VILLAGE_THEMES.clear()
+        VILLAGE_THEMES.update(saved)
+
+# -------------------------------
+# Timing helpers
+# -------------------------------
+def _time(fn, repeat, setup=None):
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn()
+            runs.append(time.perf_counter() - start)
+    return {"seconds": statistics.median(runs), "runs": runs}
+
+
+def _wipe(path):
+    def setup():
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+        # so serial runs don't reuse the previous run's gzips or rewritten palettes
+        OBJECT_STORE.clear()
+        PALETTE_CACHE.clear()
+    return setup
+
+
+def bench_stages(sample, rules, repeat):
+    """Time each step of reskin_nbt separately on one sample file."""
+    out_path = sample + ".out"
+    raw = structure_nbt.read_raw(sample)
+    nbt = structure_nbt.StructureNBT(raw)
+
+    warm = PaletteCache()
+    warm.rewrite(nbt, rules)
+
+    stages = {
+        "read": lambda: structure_nbt.read_raw(sample),
+        "parse": lambda: structure_nbt.StructureNBT(raw),
+        "transform": lambda: PaletteCache().rewrite(nbt, rules),
+        "transform.cached": lambda: warm.rewrite(nbt, rules),
+        "serialize": nbt.to_bytes,
+        "save.dev": lambda: nbt.save(out_path, PROFILES["dev"]),
+        "save": lambda: nbt.save(out_path),
+        # out_path already holds this payload: only the compare is paid
+        "save.kept": lambda: ObjectStore().save(nbt, out_path),
+    }
+    return {name: _time(fn, repeat) for name, fn in stages.items()}
+
+
+def run_benchmarks(args):
+    work = tempfile.mkdtemp(prefix="morevillages-bench-")
+    try:
+        data = generate_inputs(work, args.files, args.palette, args.blocks,
+                               args.pool_files, args.pool_elements, args.seed)
+        out = os.path.join(work, "data", "morevillages")
+        village_in = os.path.join(data, "structures", "village")
+        village_out = os.path.join(out, "structures", "village")
+        mansion_in = os.path.join(data, "structures", "woodland_mansion")
+        mansion_out = os.path.join(out, "structures", "paleoak_mansion")
+
+        mats = VILLAGE_THEMES["cherry"]
+        rules = themes.compile_rules(mats["wood"], mats["stone"])
+        sample = os.path.join(village_in, mats["base"], "houses", f"{mats['base']}_houses_0.nbt")
+        sample_out = sample + ".reskinned"
+
+        results = {}
+        with extra_themes(args.extra_themes):
+            results["reskin_nbt"] = _time(
+                lambda: village_structure.reskin_nbt(sample, sample_out, rules), args.repeat,
+                setup=_wipe(sample_out))
+            results["reskin_nbt.stages"] = bench_stages(sample, rules, args.repeat)
+            results["reskin_villages"] = _time(
+                lambda: village_structure.reskin_villages(village_in, village_out, workers=args.workers),
+                args.repeat, setup=_wipe(village_out))
+            results["reskin_villages.incremental"] = _time(
+                lambda: village_structure.reskin_villages(village_in, village_out, workers=args.workers),
+                args.repeat)
+            results["reskin_mansion"] = _time(
+                lambda: mansion_structure.reskin_mansion(mansion_in, mansion_out),
+                args.repeat, setup=_wipe(mansion_out))
+            results["reskin_worldgen"] = _time(
+                lambda: village_worldgen.reskin_worldgen(data, out),
+                args.repeat, setup=_wipe(os.path.join(out, "worldgen")))
+            results["reskin_tags"] = _time(
+                lambda: village_tags.reskin_tags(data, out),
+                args.repeat, setup=_wipe(os.path.join(out, "tags")))
+
+        return {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "themes": len(VILLAGE_THEMES) + args.extra_themes,
+                "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+            },
+            "results": results,
+        }
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+# -------------------------------
+# Reporting / comparison
+# -------------------------------
+def _flatten(results, prefix=""):
+    for name, value in results.items():
+        if "seconds" in value:
+            yield prefix + name, value["seconds"]
+        else:
+            yield from _flatten(value, prefix + name + ".")
+
+
+def compare(old, new, threshold):
+    """Print per-benchmark deltas; return the names that got slower than `threshold`."""
+    old_times = dict(_flatten(old["results"]))
+    regressions = []
+    for name, seconds in _flatten(new["results"]):
+        before = old_times.get(name)
+        if before is None:
+            print(f"  {name:<40} {seconds * 1000:10.2f} ms   (new)")
+            continue
+        change = (seconds - before) / before if before else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  ⚠️ regression"
+            regressions.append(name)
+        print(f"  {name:<40} {seconds * 1000:10.2f} ms  {change:+7.1%}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the datapack generation scripts on synthetic inputs")
+    parser.add_argument("--files", type=int, default=40, help="structure NBTs per base (and mansion pieces)")
+    parser.add_argument("--palette", type=int, default=60, help="palette entries per structure")
+    parser.add_argument("--blocks", type=int, default=2000, help="blocks per structure")
+    parser.add_argument("--pool-files", type=int, default=10, help="template pool JSONs per base")
+    parser.add_argument("--pool-elements", type=int, default=40, help="elements per template pool")
+    parser.add_argument("--extra-themes", type=int, default=0, help="cloned themes to add on top of VILLAGE_THEMES")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="reskin_villages worker processes")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark (median is reported)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="slowdown fraction reported as a regression")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+
+    print(f"Benchmarks ({report['meta']['themes']} themes):")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fh:
+            regressions = compare(json.load(fh), report, args.threshold)
+        if regressions:
+            print(f"\n⚠️ {len(regressions)} regression(s) over {args.threshold:.0%}")
+            sys.exit(1)
+    else:
+        for name, seconds in _flatten(report["results"]):
+            print(f"  {name:<40} {seconds * 1000:10.2f} ms")
+    print("\n✅ Results written to:", os.path.abspath(args.out))
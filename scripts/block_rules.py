@@ -0,0 +1,169 @@
+from build_manifest import params_hash
+
+# -------------------------------
+# Block-state-aware replacement rules
+# -------------------------------
+# A Rule rewrites one palette entry:
+#   match   block ID, optionally with one "*" wildcard ("minecraft:*_slab")
+#   to      new block ID; a "*" in it is filled with what the wildcard matched
+#   when    property subset the entry must have, e.g. {"type": "double"}
+#   props   properties to set on the result (None removes the property)
+#   rename  properties to rename, e.g. {"axis": "facing"}
+#
+# A RuleSet compiles its rules once into an index keyed by (name, property
+# subset). Wildcards are resolved the first time a name is seen and then
+# memoized, so each palette entry costs one dict lookup however many rules
+# there are. When several rules fit, exact names beat wildcards and larger
+# `when` subsets beat smaller ones; a later rule with the same match and
+# `when` replaces the earlier one, like merging replacement dicts.
+#
+# A whole block family ("every oak block") is two wildcard rules, see
+# family_rules(), so new woods need no per-block tables.
+
+
+class Rule:
+    __slots__ = ("match", "to", "when", "props", "rename")
+
+    def __init__(self, match, to, when=None, props=None, rename=None):
+        if match.count("*") > 1:
+            raise ValueError(f"rule match may hold one '*' wildcard at most: {match}")
+        self.match = match
+        self.to = to
+        self.when = dict(when or {})
+        self.props = dict(props or {})
+        self.rename = dict(rename or {})
+
+    @property
+    def when_key(self):
+        return tuple(sorted(self.when.items()))
+
+    def target(self, captured=""):
+        return self.to.replace("*", captured)
+
+    def spec(self):
+        spec = {"match": self.match, "to": self.to}
+        for field in ("when", "props", "rename"):
+            if getattr(self, field):
+                spec[field] = getattr(self, field)
+        return spec
+
+
+def map_rules(*maps):
+    """Name-only rules from plain {old_id: new_id} dicts; later maps win."""
+    return [Rule(old, new) for mapping in maps for old, new in mapping.items()]
+
+
+def family_rules(old, new, keep=()):
+    """
+    Rules renaming one block family into another, e.g. "minecraft:oak" ->
+    "minecraft:cherry": minecraft:oak_* becomes minecraft:cherry_* and
+    minecraft:stripped_oak_* becomes minecraft:stripped_cherry_*.
+    keep: suffixes left as they are (exact rules beat the wildcards),
+          e.g. "leaves" for blocks not every family has
+    """
+    old_ns, old_name = old.split(":")
+    new_ns, new_name = new.split(":")
+    rules = [
+        Rule(f"{old_ns}:{old_name}_*", f"{new_ns}:{new_name}_*"),
+        Rule(f"{old_ns}:stripped_{old_name}_*", f"{new_ns}:stripped_{new_name}_*"),
+    ]
+    for suffix in keep:
+        block = f"{old_ns}:{old_name}_{suffix}"
+        rules.append(Rule(block, block))
+    return rules
+
+
+class RuleSet:
+    """Compiled, picklable set of Rules; see apply()."""
+
+    def __init__(self, rules=()):
+        self.rules = []
+        self._exact = {}       # name -> {when_key: rule}
+        self._wildcards = {}   # (prefix, suffix) -> {when_key: rule}
+        for rule in rules:
+            self.add(rule)
+
+    @classmethod
+    def from_map(cls, *maps):
+        """Name-only rules from plain {old_id: new_id} dicts; later maps win."""
+        return cls(map_rules(*maps))
+
+    def add(self, rule):
+        self.rules.append(rule)
+        if "*" in rule.match:
+            prefix, suffix = rule.match.split("*")
+            self._wildcards.setdefault((prefix, suffix), {})[rule.when_key] = rule
+        else:
+            self._exact.setdefault(rule.match, {})[rule.when_key] = rule
+        self._resolved = {}
+        self._fingerprint = None
+        return self
+
+    @property
+    def fingerprint(self):
+        """Content hash of the rules, stable across processes (manifest / cache key)."""
+        if self._fingerprint is None:
+            self._fingerprint = params_hash([rule.spec() for rule in self.rules])
+        return self._fingerprint
+
+    def _resolve(self, name):
+        """[(when items, rule, new name)] that could apply to `name`, best first."""
+        found = self._resolved.get(name)
+        if found is None:
+            found = []
+            for when_key, rule in self._exact.get(name, {}).items():
+                found.append((0, when_key, rule, rule.target()))
+            for (prefix, suffix), by_when in self._wildcards.items():
+                if len(name) >= len(prefix) + len(suffix) and name.startswith(prefix) and name.endswith(suffix):
+                    captured = name[len(prefix):len(name) - len(suffix)]
+                    for when_key, rule in by_when.items():
+                        found.append((1, when_key, rule, rule.target(captured)))
+            # exact before wildcard, then the most specific property subset
+            found.sort(key=lambda item: (item[0], -len(item[1])))
+            found = self._resolved[name] = [item[1:] for item in found]
+        return found
+
+    def lookup(self, name, properties=None):
+        """(rule, new name) for a block state, or (None, name) if no rule fits."""
+        properties = properties or {}
+        for when_key, rule, new_name in self._resolve(name):
+            if all(properties.get(k) == v for k, v in when_key):
+                return rule, new_name
+        return None, name
+
+    def apply(self, entry):
+        """Rewrite a palette entry dict in place; True if its name or properties changed."""
+        candidates = self._resolve(entry["Name"])
+        if not candidates:
+            return False
+        properties = entry.get("Properties")
+        rule, new_name = self.lookup(entry["Name"], properties if isinstance(properties, dict) else None)
+        if rule is None:
+            return False
+
+        changed = new_name != entry["Name"]
+        entry["Name"] = new_name
+        if rule.rename or rule.props:
+            new_props = dict(properties) if isinstance(properties, dict) else {}
+            for old, new in rule.rename.items():
+                if old in new_props:
+                    new_props[new] = new_props.pop(old)
+            for key, value in rule.props.items():
+                if value is None:
+                    new_props.pop(key, None)
+                else:
+                    new_props[key] = value
+            if new_props != (properties or {}):
+                changed = True
+                if new_props:
+                    entry["Properties"] = new_props
+                else:
+                    entry.pop("Properties", None)
+        return changed
+
+    def __getstate__(self):
+        # the memo is rebuilt lazily wherever the rules end up
+        return {"rules": self.rules}
+
+    def __setstate__(self, state):
+        self.__init__(state["rules"])
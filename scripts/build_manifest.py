@@ -0,0 +1,101 @@
+import os
+import json
+import hashlib
+
+MANIFEST_NAME = ".build_manifest.json"
+
+# -------------------------------
+# Hash helpers
+# -------------------------------
+_file_hashes = {}  # (path, mtime_ns, size) -> sha256, shared by every manifest in this process
+
+def file_hash(path):
+    """sha256 of a file's bytes, memoized on (path, mtime, size)."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    digest = _file_hashes.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        _file_hashes[key] = digest
+    return digest
+
+
+def params_hash(params):
+    """sha256 of any JSON-serializable value (replacement maps, theme definitions...)."""
+    blob = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+# -------------------------------
+# Build manifest
+# -------------------------------
+class BuildManifest:
+    """
+    Records, for every output under `out_dir`, the hash of each input file,
+    a hash of the parameters used to build it and the script version.
+
+    A run asks is_fresh() before rebuilding an output and calls record()
+    after writing it; prune() then deletes outputs listed by the previous
+    run that this run no longer produces. When no manifest exists yet,
+    `fresh_start` is True and callers should wipe their outputs as before.
+    """
+
+    def __init__(self, out_dir, version):
+        self.out_dir = os.path.normpath(out_dir)
+        self.version = version
+        self.path = os.path.join(self.out_dir, MANIFEST_NAME)
+        self.entries = {}
+        self.seen = set()
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+            if data.get("version") == version:
+                self.entries = data.get("outputs", {})
+        except (OSError, ValueError):
+            pass
+        self.fresh_start = not self.entries
+
+    def _key(self, out_path):
+        return os.path.relpath(out_path, self.out_dir).replace(os.sep, "/")
+
+    def _inputs(self, inputs):
+        return {os.path.normpath(p).replace(os.sep, "/"): file_hash(p) for p in inputs}
+
+    def is_fresh(self, out_path, inputs, params):
+        """True if out_path exists and was built from these exact inputs and params."""
+        key = self._key(out_path)
+        self.seen.add(key)
+        entry = self.entries.get(key)
+        if entry is None or not os.path.exists(out_path):
+            return False
+        return entry["params"] == params_hash(params) and entry["inputs"] == self._inputs(inputs)
+
+    def record(self, out_path, inputs, params):
+        key = self._key(out_path)
+        self.seen.add(key)
+        self.entries[key] = {"inputs": self._inputs(inputs), "params": params_hash(params)}
+
+    def prune(self):
+        """Delete outputs from the previous run that were not produced by this one."""
+        removed = []
+        for key in sorted(set(self.entries) - self.seen):
+            path = os.path.join(self.out_dir, key)
+            if os.path.exists(path):
+                os.remove(path)
+                removed.append(path)
+                # drop directories the orphan leaves empty
+                parent = os.path.dirname(path)
+                while parent != self.out_dir and os.path.isdir(parent) and not os.listdir(parent):
+                    os.rmdir(parent)
+                    parent = os.path.dirname(parent)
+            del self.entries[key]
+        return removed
+
+    def save(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as fh:
+            json.dump({"version": self.version, "outputs": self.entries}, fh, indent=2, sort_keys=True)
@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import village_structure
+import mansion_structure
+import village_worldgen
+import village_tags
+import datapack_zip
+import validate_pack
+from build_manifest import file_hash, params_hash
+from build_stats import STATS, add_arguments, configure
+from json_output import JSON, JsonFormat, COMPACT, add_arguments as add_json_arguments, configure as configure_json
+from object_store import OBJECT_STORE, add_arguments as add_gzip_arguments, configure as configure_gzip
+from themes import MOD_NS, VILLAGE_THEMES
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_NAME = ".build_state.json"
+
+# -------------------------------
+# Stages
+# -------------------------------
+class Stage:
+    """
+    One node of the build graph.
+    inputs/outputs: files or folders the stage reads/writes
+    sources: script files whose code the stage depends on
+    deps: names of stages that must finish first
+    always: run on every build, even when nothing changed (checks)
+    """
+
+    def __init__(self, name, run, inputs, outputs, sources, deps=(), always=False):
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.sources = [os.path.join(SCRIPTS_DIR, s) for s in sources]
+        self.deps = tuple(deps)
+        self.always = always
+
+    def fingerprint(self):
+        """Cheap stat-based fingerprint of inputs + hash of code and theme registry."""
+        h = hashlib.sha256()
+        for path in self.inputs:
+            for file_path in sorted(_walk_files(path)):
+                st = os.stat(file_path)
+                h.update(f"{file_path}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+        return params_hash({
+            "inputs": h.hexdigest(),
+            "sources": [file_hash(s) for s in self.sources],
+            "themes": VILLAGE_THEMES,
+            "mod_ns": MOD_NS,
+            "json": JSON.mode,
+            "gzip": OBJECT_STORE.options(),
+        })
+
+    def outputs_exist(self):
+        return all(os.path.exists(path) for path in self.outputs)
+
+
+def _walk_files(path):
+    if os.path.isfile(path):
+        yield path
+        return
+    for root, _, files in os.walk(path):
+        for f in files:
+            yield os.path.join(root, f)
+
+
+def build_stages(base_dir, out_dir, workers=None, zip_dir=None, memory_budget=None,
+                 overlay=datapack_zip.VILLAGE_OVERLAY, mansion_overlay=datapack_zip.MANSION_OVERLAY):
+    """
+    The full pack build: structures, mansion, worldgen and tags are independent;
+    validate checks the cross-references once they are all done.
+    With zip_dir, a package stage also streams both datapacks into zips there,
+    adding the hand-authored files of the overlay folders.
+    """
+    common = ["themes.py", "themes.json", "build_manifest.py", "build_stats.py", "json_output.py"]
+    nbt = ["structure_nbt.py", "palette_cache.py", "block_rules.py", "memory_budget.py", "object_store.py", "reskin.py"]
+    village_in = os.path.join(base_dir, "structures", "village")
+    village_out = os.path.join(out_dir, "structures", "village")
+    mansion_in = os.path.join(base_dir, "structures", "woodland_mansion")
+    mansion_out = os.path.join(out_dir, "structures", "paleoak_mansion")
+    stages = [
+        Stage("structures",
+              lambda: village_structure.reskin_villages(village_in, village_out, workers=workers,
+                                                        memory_budget=memory_budget),
+              inputs=[village_in], outputs=[village_out],
+              sources=common + nbt + ["village_structure.py", "village_worldgen.py"]),
+        Stage("mansion",
+              lambda: mansion_structure.reskin_mansion(mansion_in, mansion_out, memory_budget=memory_budget),
+              inputs=[mansion_in], outputs=[mansion_out],
+              sources=common + nbt + ["mansion_structure.py"]),
+        Stage("worldgen",
+              lambda: village_worldgen.reskin_worldgen(base_dir, out_dir),
+              inputs=[os.path.join(base_dir, "worldgen")], outputs=[os.path.join(out_dir, "worldgen")],
+              sources=common + ["village_worldgen.py"]),
+        Stage("tags",
+              lambda: village_tags.reskin_tags(base_dir, out_dir),
+              inputs=[os.path.join(base_dir, "tags", "worldgen", "structure", "village.json")],
+              outputs=[os.path.join(out_dir, "tags")],
+              sources=common + ["village_tags.py"]),
+        Stage("validate",
+              lambda: _validate(out_dir),
+              inputs=[out_dir], outputs=[],
+              sources=common + ["validate_pack.py"],
+              deps=("structures", "mansion", "worldgen", "tags"), always=True),
+    ]
+    if zip_dir:
+        # the zips are the release artifact: always compact JSON, as datapack_zip.py
+        # writes them, whatever layout the generated tree uses
+        stages.append(Stage("package",
+                            lambda: datapack_zip.package_all(base_dir, zip_dir, overlay=overlay,
+                                                             mansion_overlay=mansion_overlay,
+                                                             json_format=JsonFormat(COMPACT)),
+                            inputs=[base_dir] + [d for d in (overlay, mansion_overlay) if d and os.path.isdir(d)],
+                            outputs=[os.path.join(zip_dir, "MoreVillages.zip"),
+                                     os.path.join(zip_dir, "PaleOakMansions.zip")],
+                            sources=common + nbt + ["datapack_zip.py", "village_structure.py", "mansion_structure.py",
+                                                    "village_worldgen.py", "village_tags.py"]))
+    return stages
+
+def _validate(out_dir):
+    errors = validate_pack.validate_paths([out_dir])
+    if errors:
+        raise ValueError(f"{errors} broken reference(s) in {out_dir}")
+
+# -------------------------------
+# Scheduler
+# -------------------------------
+def _load_state(path):
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _run_timed(stage):
+    start = time.perf_counter()
+    stage.run()
+    return time.perf_counter() - start
+
+
+def run_pipeline(stages, state_path, force=False):
+    """
+    Run `stages` as a DAG: every stage whose deps are done is submitted to a
+    thread pool, so independent stages overlap. A stage is skipped when its
+    fingerprint matches the last successful run, its outputs exist and none
+    of its deps re-ran. Returns {stage name: "ran" | "skipped" | "failed"}.
+    """
+    by_name = {s.name: s for s in stages}
+    for stage in stages:
+        missing = [d for d in stage.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"stage {stage.name} depends on unknown stage(s): {', '.join(missing)}")
+
+    state = _load_state(state_path)
+    status = {}
+    timings = {}
+    pending = dict(by_name)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, len(stages))) as pool:
+        while pending or running:
+            progressed = False
+            for name, stage in list(pending.items()):
+                if any(status.get(d) == "failed" for d in stage.deps):
+                    STATS.warn(f"Not running {name}: a dependency failed")
+                    status[name] = "failed"
+                elif all(d in status for d in stage.deps):
+                    fingerprint = stage.fingerprint()
+                    upstream_ran = any(status[d] == "ran" for d in stage.deps)
+                    if not force and not stage.always and not upstream_ran and stage.outputs_exist() \
+                            and state.get(name) == fingerprint:
+                        STATS.log(f"[{name}] up to date, skipping")
+                        status[name] = "skipped"
+                    else:
+                        print(f"[{name}] started")
+                        running[pool.submit(_run_timed, stage)] = (stage, fingerprint)
+                else:
+                    continue
+                del pending[name]
+                progressed = True
+
+            if not running:
+                if pending and not progressed:
+                    raise ValueError(f"dependency cycle between stages: {', '.join(pending)}")
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, fingerprint = running.pop(future)
+                try:
+                    timings[stage.name] = future.result()
+                except Exception as e:
+                    STATS.warn(f"[{stage.name}] failed: {e}")
+                    status[stage.name] = "failed"
+                    state.pop(stage.name, None)
+                    continue
+                status[stage.name] = "ran"
+                state[stage.name] = fingerprint
+                print(f"[{stage.name}] finished in {timings[stage.name]:.2f}s")
+
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    with open(state_path, "w", encoding="utf-8") as fh:
+        json.dump(state, fh, indent=2, sort_keys=True)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build every generated part of the pack in one run")
+    parser.add_argument("--base-dir", default="./data/minecraft", help="vanilla data to reskin")
+    parser.add_argument("--out-dir", default="./data/morevillages", help="where generated data goes")
+    parser.add_argument("--stages", help="comma separated subset of stages to run")
+    parser.add_argument("--force", action="store_true", help="run stages even if their inputs are unchanged")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="worker processes for the structures stage (default: one per CPU)")
+    parser.add_argument("--zip-dir", help="also package both datapacks as zips in this folder")
+    parser.add_argument("--memory-budget", type=float, metavar="MB",
+                        help="cap on template data the structure stages hold at once")
+    datapack_zip.add_overlay_arguments(parser)
+    add_arguments(parser)
+    add_json_arguments(parser)
+    add_gzip_arguments(parser)
+    args = parser.parse_args()
+    configure(args.verbose, args.trace)
+    configure_json(args.compact, args.json_report)
+    configure_gzip(args.gzip, args.reuse_source)
+
+    stages = build_stages(args.base_dir, args.out_dir, args.workers, args.zip_dir, args.memory_budget,
+                          args.overlay, args.mansion_overlay)
+    if args.stages:
+        wanted = set(args.stages.split(","))
+        unknown = wanted - {s.name for s in stages}
+        if unknown:
+            parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+        stages = [s for s in stages if s.name in wanted]
+        for stage in stages:
+            stage.deps = tuple(d for d in stage.deps if d in wanted)
+
+    start = time.perf_counter()
+    status = run_pipeline(stages, os.path.join(args.out_dir, STATE_NAME), force=args.force)
+    STATS.report("Pack build")
+    JSON.report()
+
+    print("\nStages: " + ", ".join(f"{name} {result}" for name, result in status.items()))
+    print(f"✅ Pack built in {time.perf_counter() - start:.2f}s")
+    if "failed" in status.values():
+        sys.exit(1)
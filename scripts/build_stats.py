@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:   # not available on Windows
+    resource = None
+
+# -------------------------------
+# Build instrumentation
+# -------------------------------
+# Per-theme counters and stage timings shared by every generation script.
+# Quiet by default: log() only prints with --verbose, warn() always prints,
+# and an optional JSON-lines trace records one event per file.
+
+COUNTERS = ("files", "palette", "bytes_in", "bytes_out", "cache_hits", "cache_misses",
+            "noop", "reused", "kept")   # object store: unchanged reskins, gzips reused, writes skipped
+STAGES = ("load", "transform", "save")
+# highest resident set size sampled after any stage. It is the size of the
+# whole process (a worker's, for pooled runs), not what one stage allocated.
+PEAKS = ("rss",)
+
+
+def current_rss():
+    """Resident set size of this process in bytes (peak so far where the current value isn't available)."""
+    try:
+        with open("/proc/self/statm", "rb") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class BuildStats:
+    def __init__(self, verbose=False, trace_path=None):
+        self._trace = None
+        self._lock = threading.Lock()   # stages may run concurrently in threads
+        self.reset(verbose, trace_path)
+
+    def reset(self, verbose=False, trace_path=None):
+        self.close()
+        self.verbose = verbose
+        self.trace_path = trace_path
+        self.themes = {}       # theme -> {counter/stage: value}
+
+    def options(self):
+        """Settings to rebuild an equivalent BuildStats in a worker process."""
+        return {"verbose": self.verbose, "trace_path": self.trace_path}
+
+    def _theme(self, theme):
+        row = self.themes.get(theme)
+        if row is None:
+            row = self.themes[theme] = dict.fromkeys(COUNTERS + STAGES + PEAKS, 0)
+        return row
+
+    def count(self, theme, **counters):
+        """Add to per-theme counters (see COUNTERS)."""
+        with self._lock:
+            row = self._theme(theme)
+            for name, value in counters.items():
+                row[name] += value
+
+    def add_time(self, theme, stage, seconds):
+        with self._lock:
+            self._theme(theme)[stage] += seconds
+
+    def sample_rss(self, theme):
+        rss = current_rss()
+        with self._lock:
+            row = self._theme(theme)
+            if rss > row["rss"]:
+                row["rss"] = rss
+
+    @contextmanager
+    def time(self, theme, stage, event=None):
+        """Time a load/transform/save block, add it to `theme` and to the trace `event` dict."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.add_time(theme, stage, elapsed)
+            self.sample_rss(theme)
+            if event is not None:
+                event[stage] = elapsed
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def warn(self, message):
+        print(f"⚠️ {message}")
+
+    def trace(self, **event):
+        """Append one JSON-lines event to the trace file, if tracing is on."""
+        if not self.trace_path:
+            return
+        event.setdefault("t", time.time())
+        line = json.dumps(event, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._trace is None:
+                self._trace = open(self.trace_path, "a", encoding="utf-8", buffering=1)
+            self._trace.write(line)
+
+    def close(self):
+        if self._trace is not None:
+            self._trace.close()
+            self._trace = None
+
+    def snapshot(self):
+        return {theme: dict(row) for theme, row in self.themes.items()}
+
+    def merge(self, snapshot):
+        """Fold in counters returned from a worker process."""
+        with self._lock:
+            for theme, row in snapshot.items():
+                mine = self._theme(theme)
+                for name, value in row.items():
+                    if name in PEAKS:
+                        mine[name] = max(mine[name], value)
+                    else:
+                        mine[name] += value
+
+    def report(self, title="Build summary"):
+        if not self.themes:
+            return
+        header = f"{'theme':<20}{'files':>7}{'palette':>9}{'in KB':>10}{'out KB':>10}{'cache %':>9}" + \
+                 "".join(f"{stage + ' s':>13}" for stage in STAGES)
+        print(f"\n{title}\n{header}\n{'-' * len(header)}")
+        total = dict.fromkeys(COUNTERS + STAGES + PEAKS, 0)
+        for theme, row in sorted(self.themes.items()):
+            self._print_row(theme, row)
+            for name, value in row.items():
+                total[name] = max(total[name], value) if name in PEAKS else total[name] + value
+        self._print_row("total", total)
+        if total["reused"] or total["kept"]:
+            print(f"objects   {total['noop']} unchanged by their theme, {total['reused']} gzips reused, "
+                  f"{total['kept']} writes skipped (already on disk)")
+        if total["rss"]:
+            print(f"process peak RSS {total['rss'] / 2**20:.1f} MB (largest of this process and its workers)")
+
+    @staticmethod
+    def _print_row(name, row):
+        lookups = row["cache_hits"] + row["cache_misses"]
+        hit_rate = f"{100 * row['cache_hits'] / lookups:.0f}" if lookups else "-"
+        print(f"{name:<20}{row['files']:>7}{row['palette']:>9}"
+              f"{row['bytes_in'] / 1024:>10.1f}{row['bytes_out'] / 1024:>10.1f}{hit_rate:>9}" +
+              "".join(f"{row[stage]:>13.3f}" for stage in STAGES))
+
+
+# shared instance the scripts log to; configure() sets it up from the CLI
+STATS = BuildStats()
+
+
+def add_arguments(parser):
+    parser.add_argument("-v", "--verbose", action="store_true", help="print a line per file")
+    parser.add_argument("--trace", metavar="PATH", help="write a JSON-lines timing trace to PATH")
+
+
+def configure(verbose=False, trace_path=None):
+    """Reset the shared STATS; truncates the trace file so a run starts clean."""
+    if trace_path:
+        open(trace_path, "w").close()
+    STATS.reset(verbose, trace_path)
+    return STATS
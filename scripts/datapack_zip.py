@@ -0,0 +1,295 @@
+import os
+import json
+import zipfile
+import argparse
+import structure_nbt
+from reskin import reskin_targets
+from object_store import OBJECT_STORE, ObjectStore, structure_payload, COMPRESSED, REUSED, SOURCE, \
+    add_arguments as add_gzip_arguments, configure as configure_gzip
+import mansion_structure
+from village_worldgen import recursive_replace, add_structure_set_entries
+from village_tags import add_structure_tag_values
+from build_stats import STATS, add_arguments, configure
+from json_output import JSON, add_arguments as add_json_arguments, configure as configure_json
+from themes import MOD_NS, VILLAGE_THEMES, biomes, group_themes_by_base, theme_rules, themed_template
+
+PACK_FORMAT = 71
+
+# fixed entry timestamp so the same inputs always give a byte-identical zip
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+# folder the shipped MansionDatapack uses for the reskinned pieces
+MANSION_DIR = "pale_mansion"
+
+# hand-assembled packs whose hand-authored files (features, the mansion's
+# structure_set and tags...) are added on top of the generated content
+VILLAGE_OVERLAY = "./MoreVillagesDatapack"
+MANSION_OVERLAY = "./MansionDatapack"
+
+# -------------------------------
+# Zip writer
+# -------------------------------
+class ZipPackWriter:
+    """
+    Streams generated files straight into a datapack zip, no staging folder.
+
+    Entries are written in the order they are produced. .nbt files are
+    already gzipped, so they are STORED; everything else is DEFLATED.
+    With `dedup`, NBT payloads go through an ObjectStore keyed by the sha256
+    of their uncompressed bytes, so each is gzipped once and later identical
+    payloads reuse those bytes. JSON is serialized with `json_format`
+    (a json_output.JsonFormat), the shared JSON instance by default.
+    """
+
+    def __init__(self, path, description, pack_format=PACK_FORMAT, dedup=False, compresslevel=9,
+                 reuse_source=False, json_format=None):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.dedup = dedup
+        self.compresslevel = compresslevel
+        self.names = set()
+        # unbounded: a pack is a few MB of gzip at most
+        self.store = ObjectStore(compresslevel, max_bytes=float("inf"), reuse_source=reuse_source) if dedup else None
+        self.reuse_source = reuse_source
+        self.json = JSON if json_format is None else json_format
+        self._zip = zipfile.ZipFile(path, "w")
+        self.write_json("pack.mcmeta", {"pack": {"description": description, "pack_format": pack_format}})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, name, data):
+        """Add one entry; returns the number of bytes it takes in the pack."""
+        if name in self.names:
+            STATS.warn(f"Duplicate zip entry skipped: {name}")
+            return 0
+        self.names.add(name)
+        info = zipfile.ZipInfo(name, ZIP_DATE)
+        info.external_attr = 0o644 << 16
+        if name.endswith(".nbt"):
+            info.compress_type = zipfile.ZIP_STORED
+            self._zip.writestr(info, data)
+        else:
+            info.compress_type = zipfile.ZIP_DEFLATED
+            self._zip.writestr(info, data, compresslevel=self.compresslevel)
+        return len(data)
+
+    def write_json(self, name, obj):
+        return self.write(name, self.json.dumps(obj))
+
+    def save(self, nbt, name, changed=True, source_path=None):
+        """
+        Gzip a StructureNBT (once per distinct payload with dedup) and add it;
+        returns (bytes, object_store status), so the writer can be a reskin sink.
+        With reuse_source, an unchanged one is added as the bytes of source_path.
+        """
+        if not changed and self.reuse_source and source_path is not None:
+            with open(source_path, "rb") as fh:
+                data = fh.read()
+            if data[:2] == b"\x1f\x8b":
+                return self.write(name, data), SOURCE
+        if not self.dedup:
+            raw = nbt.to_bytes() if changed else nbt.source
+            return self.write(name, structure_nbt.gzip_bytes(raw, self.compresslevel)), COMPRESSED
+        data, reused = self.store.gzipped(*structure_payload(nbt, changed))
+        return self.write(name, data), REUSED if reused else COMPRESSED
+
+    def add_tree(self, src_dir, prefix=""):
+        """
+        Add every file under src_dir that isn't already in the pack (hand-authored
+        extras). Templates are skipped: they always come from the reskin, and
+        the hand-assembled packs also hold stale copies of them.
+        """
+        for root, dirs, files in os.walk(src_dir):
+            dirs.sort()
+            for f in sorted(files):
+                path = os.path.join(root, f)
+                name = prefix + os.path.relpath(path, src_dir).replace(os.sep, "/")
+                if name in self.names or name.endswith(".nbt"):
+                    continue
+                with open(path, "rb") as fh:
+                    self.write(name, fh.read())
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+# -------------------------------
+# Pack contents
+# -------------------------------
+def _reskin_into(writer, path, targets):
+    """Load a base NBT once and write one reskinned entry per (theme, name, rules)."""
+    reskin_targets(path, targets, sink=writer, script="datapack_zip")
+
+
+def write_village_structures(writer, base_dir):
+    """data/morevillages/structures/village/<theme>/..., same layout as village_structure.py."""
+    village_dir = os.path.join(base_dir, "structures", "village")
+    for base, themes in group_themes_by_base(VILLAGE_THEMES).items():
+        base_path = os.path.join(village_dir, base)
+        if not os.path.exists(base_path):
+            STATS.warn(f"Base path does not exist, skipping: {os.path.abspath(base_path)}")
+            continue
+        rules_by_theme = {theme: theme_rules(theme) for theme in themes}
+        for root, dirs, files in os.walk(base_path):
+            dirs.sort()
+            for f in sorted(files):
+                if not f.endswith(".nbt"):
+                    continue
+                in_path = os.path.join(root, f)
+                rel = os.path.relpath(in_path, base_path).replace(os.sep, "/")
+                targets = [(theme, f"data/{MOD_NS}/structures/village/{themed_template(rel, base, theme)}", rules)
+                           for theme, rules in rules_by_theme.items()]
+                _reskin_into(writer, in_path, targets)
+
+
+def write_worldgen(writer, base_dir):
+    """Themed structure and template_pool JSONs, plus the extended minecraft:villages structure_set."""
+    struct_dir = os.path.join(base_dir, "worldgen", "structure")
+    pool_dir = os.path.join(base_dir, "worldgen", "template_pool", "village")
+
+    for base, themes in group_themes_by_base(VILLAGE_THEMES).items():
+        in_struct = os.path.join(struct_dir, f"village_{base}.json")
+        if not os.path.exists(in_struct):
+            STATS.warn(f"Skipping structure JSON (not found): {in_struct}")
+        else:
+            with open(in_struct, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+            for theme in themes:
+                with STATS.time(theme, "transform"):
+                    new_data = recursive_replace(data, base, theme)
+                with STATS.time(theme, "save"):
+                    size = writer.write_json(f"data/{MOD_NS}/worldgen/structure/village_{theme}.json", new_data)
+                STATS.count(theme, files=1, bytes_in=os.path.getsize(in_struct), bytes_out=size)
+
+        in_pool = os.path.join(pool_dir, base)
+        if not os.path.exists(in_pool):
+            STATS.warn(f"Skipping template pool (not found): {in_pool}")
+            continue
+        for root, dirs, files in os.walk(in_pool):
+            dirs.sort()
+            rel = os.path.relpath(root, in_pool).replace(os.sep, "/")
+            for f in sorted(files):
+                src = os.path.join(root, f)
+                with open(src, "rb") as fh:
+                    raw = fh.read()
+                data = json.loads(raw) if f.lower().endswith(".json") else None
+                for theme in themes:
+                    rel_dir = "" if rel == "." else rel + "/"
+                    name = f"data/{MOD_NS}/worldgen/template_pool/village/{theme}/{rel_dir}{f.replace(base, theme)}"
+                    if data is None:
+                        size = writer.write(name, raw)
+                    else:
+                        with STATS.time(theme, "transform"):
+                            new_data = recursive_replace(data, base, theme)
+                        with STATS.time(theme, "save"):
+                            size = writer.write_json(name, new_data)
+                    STATS.count(theme, files=1, bytes_in=len(raw), bytes_out=size)
+
+    with open(os.path.join(base_dir, "worldgen", "structure_set", "villages.json"), "r", encoding="utf-8") as fh:
+        villages_set = json.load(fh)
+    writer.write_json("data/minecraft/worldgen/structure_set/villages.json", add_structure_set_entries(villages_set))
+
+
+def write_tags(writer, base_dir):
+    """has_structure/village_<theme> biome tags and the extended #minecraft:village structure tag."""
+    for theme in VILLAGE_THEMES:
+        size = writer.write_json(f"data/minecraft/tags/worldgen/biome/has_structure/village_{theme}.json",
+                                 {"values": biomes(theme)})
+        STATS.count(theme, files=1, bytes_out=size)
+
+    with open(os.path.join(base_dir, "tags", "worldgen", "structure", "village.json"), "r", encoding="utf-8") as fh:
+        struct_tag = json.load(fh)
+    writer.write_json("data/minecraft/tags/worldgen/structure/village.json", add_structure_tag_values(struct_tag))
+
+
+def write_mansion(writer, base_dir):
+    """data/morevillages/structures/pale_mansion/..., same pieces as mansion_structure.py."""
+    rules = mansion_structure.mansion_rules()
+    mansion_dir = os.path.join(base_dir, "structures", "woodland_mansion")
+    for root, dirs, files in os.walk(mansion_dir):
+        dirs.sort()
+        for f in sorted(files):
+            if f.endswith(".nbt"):
+                in_path = os.path.join(root, f)
+                rel = os.path.relpath(in_path, mansion_dir).replace(os.sep, "/")
+                name = f"data/{MOD_NS}/structures/{MANSION_DIR}/{mansion_structure.piece_path(rel)}"
+                _reskin_into(writer, in_path, [(mansion_structure.THEME, name, rules)])
+
+# -------------------------------
+# Packaging
+# -------------------------------
+def _report(writer):
+    size = os.path.getsize(writer.path)
+    line = f"✅ {writer.path}: {len(writer.names)} entries, {size / 1024:.1f} KB"
+    if writer.dedup:
+        line += f" ({writer.store.reused} duplicate NBTs reused, {writer.store.reused_bytes / 1024:.1f} KB not recompressed)"
+    print(line)
+
+
+def _add_overlay(writer, overlay):
+    if not overlay:
+        return
+    if not os.path.isdir(overlay):
+        STATS.warn(f"Overlay not found, skipping: {os.path.abspath(overlay)}")
+        return
+    writer.add_tree(overlay)
+
+
+def package_villages(base_dir, zip_path, dedup=False, overlay=VILLAGE_OVERLAY, json_format=None):
+    """Build the More Villages datapack zip straight from the vanilla data in base_dir."""
+    with ZipPackWriter(zip_path, "More Villages", dedup=dedup, json_format=json_format,
+                       **OBJECT_STORE.options()) as writer:
+        write_village_structures(writer, base_dir)
+        write_worldgen(writer, base_dir)
+        write_tags(writer, base_dir)
+        _add_overlay(writer, overlay)
+    _report(writer)
+
+
+def package_mansion(base_dir, zip_path, dedup=False, overlay=MANSION_OVERLAY, json_format=None):
+    """Build the Pale Oak Mansions datapack zip straight from the vanilla data in base_dir."""
+    with ZipPackWriter(zip_path, "Pale Oak Mansions", dedup=dedup, json_format=json_format,
+                       **OBJECT_STORE.options()) as writer:
+        write_mansion(writer, base_dir)
+        _add_overlay(writer, overlay)
+    _report(writer)
+
+
+def package_all(base_dir, zip_dir, dedup=False, overlay=VILLAGE_OVERLAY, mansion_overlay=MANSION_OVERLAY,
+                json_format=None):
+    package_villages(base_dir, os.path.join(zip_dir, "MoreVillages.zip"), dedup, overlay, json_format)
+    package_mansion(base_dir, os.path.join(zip_dir, "PaleOakMansions.zip"), dedup, mansion_overlay, json_format)
+
+
+def add_overlay_arguments(parser):
+    parser.add_argument("--overlay", metavar="DIR", default=VILLAGE_OVERLAY,
+                        help="hand-authored files to add to the village pack, e.g. configured/placed features "
+                             f"(default: {VILLAGE_OVERLAY}, '' for none)")
+    parser.add_argument("--mansion-overlay", metavar="DIR", default=MANSION_OVERLAY,
+                        help="hand-authored files to add to the mansion pack, e.g. its structure_set and tags "
+                             f"(default: {MANSION_OVERLAY}, '' for none)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the datapack zips directly, without writing data/morevillages")
+    parser.add_argument("--base-dir", default="./data/minecraft", help="vanilla data to reskin")
+    parser.add_argument("--zip-dir", default="./dist", help="where MoreVillages.zip and PaleOakMansions.zip go")
+    parser.add_argument("--dedup", action="store_true", help="gzip identical NBT payloads once and reuse the bytes")
+    add_overlay_arguments(parser)
+    add_arguments(parser)
+    add_json_arguments(parser, compact=True)
+    add_gzip_arguments(parser)
+    args = parser.parse_args()
+    configure(args.verbose, args.trace)
+    configure_json(args.compact, args.json_report)
+    configure_gzip(args.gzip, args.reuse_source)
+
+    package_all(args.base_dir, args.zip_dir, dedup=args.dedup, overlay=args.overlay,
+                mansion_overlay=args.mansion_overlay)
+    STATS.report("Datapack zips")
+    JSON.report()
@@ -0,0 +1,121 @@
+import os
+import csv
+import time
+import argparse
+import structure_nbt
+from object_store import PROFILES, payload_digest
+from build_stats import STATS, add_arguments, configure
+
+# -------------------------------
+# Compression profile report
+# -------------------------------
+# Gzips every generated template with each profile in object_store.PROFILES
+# and reports the time and size per file and in total. "<profile>+source" is
+# what --reuse-source gives: a template whose payload is byte-identical to
+# a vanilla one (a theme changed nothing in it) costs no compression and
+# takes the vanilla file's size; the rest are compressed with the profile.
+
+
+def vanilla_sizes(base_dir):
+    """{payload sha256: gzipped file size} for every vanilla template under base_dir."""
+    sizes = {}
+    for root, _, files in os.walk(base_dir):
+        for f in files:
+            if f.endswith(".nbt"):
+                path = os.path.join(root, f)
+                with open(path, "rb") as fh:
+                    data = fh.read()
+                if data[:2] == b"\x1f\x8b":
+                    sizes[payload_digest(structure_nbt.decompress(data))] = len(data)
+    return sizes
+
+
+def _gzip_time(raw, level, repeat):
+    """(fastest of `repeat` runs in seconds, gzipped size)."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(structure_nbt.gzip_bytes(raw, level))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, size
+
+
+def measure(paths, sources, repeat=3):
+    """
+    One row per template under paths:
+    {"file", "raw", "source" (vanilla size or None), <profile>: (seconds, bytes), ...}
+    """
+    rows = []
+    for path in paths:
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for f in sorted(files):
+                if not f.endswith(".nbt"):
+                    continue
+                file_path = os.path.join(root, f)
+                raw = structure_nbt.read_raw(file_path)
+                row = {"file": file_path, "raw": len(raw), "source": sources.get(payload_digest(raw))}
+                for profile, level in PROFILES.items():
+                    row[profile] = _gzip_time(raw, level, repeat)
+                rows.append(row)
+                STATS.log(f"{file_path}: " + ", ".join(
+                    f"{p} {row[p][1]} B {row[p][0] * 1000:.2f} ms" for p in PROFILES) +
+                    (f", source {row['source']} B" if row["source"] is not None else ""))
+    return rows
+
+
+def totals(rows):
+    """{choice: (files compressed, total seconds, total bytes)} for every profile and profile+source."""
+    result = {}
+    for profile in PROFILES:
+        result[profile] = (len(rows), sum(r[profile][0] for r in rows), sum(r[profile][1] for r in rows))
+        fresh = [r for r in rows if r["source"] is None]
+        result[profile + "+source"] = (
+            len(fresh),
+            sum(r[profile][0] for r in fresh),
+            sum(r[profile][1] for r in fresh) + sum(r["source"] for r in rows if r["source"] is not None),
+        )
+    return result
+
+
+def report(rows):
+    if not rows:
+        print("⚠️ No templates found")
+        return
+    release = sum(r["release"][1] for r in rows)
+    header = f"{'choice':<18}{'gzipped':>9}{'KB':>10}{'vs release':>12}{'total ms':>11}{'ms/file':>9}"
+    print(f"\n{len(rows)} templates, {sum(r['raw'] for r in rows) / 1024:.1f} KB uncompressed\n{header}\n"
+          f"{'-' * len(header)}")
+    for choice, (files, seconds, size) in totals(rows).items():
+        print(f"{choice:<18}{files:>9}{size / 1024:>10.1f}{size / release - 1:>+12.1%}"
+              f"{seconds * 1000:>11.1f}{seconds * 1000 / len(rows):>9.3f}")
+
+
+def write_csv(rows, path):
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["file", "raw_bytes", "source_bytes"] +
+                        [f"{p}_{col}" for p in PROFILES for col in ("ms", "bytes")])
+        for r in rows:
+            writer.writerow([r["file"], r["raw"], "" if r["source"] is None else r["source"]] +
+                            [v for p in PROFILES for v in (round(r[p][0] * 1000, 3), r[p][1])])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare gzip profiles on the generated structure NBTs")
+    parser.add_argument("paths", nargs="*", default=["./data/morevillages/structures"],
+                        help="folders of generated templates")
+    parser.add_argument("--base-dir", default="./data/minecraft/structures",
+                        help="vanilla templates, for the +source (--reuse-source) choices")
+    parser.add_argument("--repeat", type=int, default=3, help="time each gzip this many times, keep the fastest")
+    parser.add_argument("--csv", metavar="PATH", help="write the per-file times and sizes to a CSV file")
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args.verbose, args.trace)
+
+    rows = measure(args.paths, vanilla_sizes(args.base_dir), args.repeat)
+    report(rows)
+    if args.csv:
+        write_csv(rows, args.csv)
+        print(f"✅ Per-file results written to: {args.csv}")
@@ -0,0 +1,103 @@
+import json
+import threading
+
+try:
+    import orjson   # optional: faster compact serializer
+except ImportError:
+    orjson = None
+
+# -------------------------------
+# JSON output format
+# -------------------------------
+# Every generated worldgen/tag JSON goes through the shared JSON instance.
+# "pretty" (the default) is the indent=2 layout the pack has always used
+# and is the one to diff; "compact" is the release layout: no whitespace,
+# non-ASCII kept as UTF-8 and keys in the same order as the source file,
+# so the same input always gives the same bytes. orjson is used for
+# compact output when it is installed, the json module otherwise.
+
+PRETTY, COMPACT = "pretty", "compact"
+
+
+def dumps_pretty(obj):
+    return json.dumps(obj, indent=2).encode("utf-8")
+
+
+def dumps_compact(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class JsonFormat:
+    """
+    Serializes generated JSON in the configured mode.
+    With `report`, every file is also sized in the other mode so report()
+    can compare pretty and compact output.
+    """
+
+    def __init__(self, mode=PRETTY, report=False):
+        self._lock = threading.Lock()   # pool files are written from IO threads
+        self.reset(mode, report)
+
+    def reset(self, mode=PRETTY, report=False):
+        if mode not in (PRETTY, COMPACT):
+            raise ValueError(f"unknown JSON mode {mode!r}")
+        self.mode = mode
+        self.report_sizes = report
+        self.files = 0
+        self.pretty_bytes = 0
+        self.compact_bytes = 0
+
+    def dumps(self, obj):
+        """Serialized bytes of obj in the current mode."""
+        if self.mode == COMPACT:
+            data = dumps_compact(obj)
+            other = dumps_pretty(obj) if self.report_sizes else None
+            sizes = (len(other) if other else 0, len(data))
+        else:
+            data = dumps_pretty(obj)
+            other = dumps_compact(obj) if self.report_sizes else None
+            sizes = (len(data), len(other) if other else 0)
+        if self.report_sizes:
+            with self._lock:
+                self.files += 1
+                self.pretty_bytes += sizes[0]
+                self.compact_bytes += sizes[1]
+        return data
+
+    def write(self, path, obj):
+        """Write obj to path; returns the number of bytes written."""
+        data = self.dumps(obj)
+        with open(path, "wb") as fh:
+            fh.write(data)
+        return len(data)
+
+    def report(self):
+        if not self.report_sizes or not self.files:
+            return
+        saved = 1 - self.compact_bytes / self.pretty_bytes if self.pretty_bytes else 0
+        print(f"\nJSON output ({self.mode}, {'orjson' if orjson is not None else 'json'}): {self.files} files, "
+              f"pretty {self.pretty_bytes / 1024:.1f} KB, compact {self.compact_bytes / 1024:.1f} KB "
+              f"({saved:.0%} smaller)")
+
+
+# shared instance the scripts write through; configure() sets it up from the CLI
+JSON = JsonFormat()
+
+
+def add_arguments(parser, compact=False):
+    if compact:
+        parser.add_argument("--pretty", dest="compact", action="store_false",
+                            help="write indented JSON instead of the compact release layout")
+    else:
+        parser.add_argument("--compact", action="store_true",
+                            help="write minified JSON (release mode) instead of indented JSON")
+    parser.set_defaults(compact=compact)
+    parser.add_argument("--json-report", action="store_true",
+                        help="compare pretty and compact sizes of every JSON written")
+
+
+def configure(compact=False, report=False):
+    JSON.reset(COMPACT if compact else PRETTY, report)
+    return JSON
@@ -1,28 +1,27 @@
 import os
 import shutil
-from nbtlib import load, String
+import posixpath
+import argparse
+from functools import lru_cache
+from reskin import reskin_targets
+from object_store import OBJECT_STORE, add_arguments as add_gzip_arguments, configure as configure_gzip
+from memory_budget import MemoryBudget, stream_templates
+from block_rules import RuleSet, family_rules, map_rules
+from build_manifest import BuildManifest
+from themes import NATURAL_WOOD_BLOCKS
+from build_stats import STATS, add_arguments, configure
+
+# bump when the reskin logic changes so every output is rebuilt
+SCRIPT_VERSION = 3
+
+# label used for this script's counters
+THEME = "paleoak_mansion"
 
 # -------------------------------
-# Wood replacement map (Dark Oak → Pale Oak)
+# Wood replacement rules (Dark Oak → Pale Oak)
 # -------------------------------
-def build_paleoak_wood_map():
-    return {
-        "minecraft:dark_oak_planks": "minecraft:pale_oak_planks",
-        "minecraft:dark_oak_log": "minecraft:pale_oak_log",
-        "minecraft:stripped_dark_oak_log": "minecraft:stripped_pale_oak_log",
-        "minecraft:dark_oak_wood": "minecraft:pale_oak_wood",
-        "minecraft:stripped_dark_oak_wood": "minecraft:stripped_pale_oak_wood",
-        "minecraft:dark_oak_stairs": "minecraft:pale_oak_stairs",
-        "minecraft:dark_oak_slab": "minecraft:pale_oak_slab",
-        "minecraft:dark_oak_fence": "minecraft:pale_oak_fence",
-        "minecraft:dark_oak_fence_gate": "minecraft:pale_oak_fence_gate",
-        "minecraft:dark_oak_door": "minecraft:pale_oak_door",
-        "minecraft:dark_oak_trapdoor": "minecraft:pale_oak_trapdoor",
-        "minecraft:dark_oak_button": "minecraft:pale_oak_button",
-        "minecraft:dark_oak_pressure_plate": "minecraft:pale_oak_pressure_plate",
-        "minecraft:dark_oak_sign": "minecraft:pale_oak_sign",
-        "minecraft:dark_oak_hanging_sign": "minecraft:pale_oak_hanging_sign",
-    }
+def build_paleoak_wood_rules():
+    return family_rules("minecraft:dark_oak", "minecraft:pale_oak", keep=NATURAL_WOOD_BLOCKS)
 
 # -------------------------------
 # Stone replacement map (Cobble → Cobbled Deepslate)
@@ -39,56 +38,80 @@ def build_stone_map():
     }
 
 # -------------------------------
-# Replace block IDs in a structure NBT
+# Compiled mansion rules
 # -------------------------------
-def reskin_nbt(path, out_path, replacements):
-    try:
-        nbt = load(path)
-    except Exception as e:
-        print(f"⚠️ Could not load {path}: {e}")
-        return
+@lru_cache(maxsize=None)
+def mansion_rules():
+    """Wood + stone rules for the mansion; also used for the mansion zip (datapack_zip.py)."""
+    return RuleSet(build_paleoak_wood_rules() + map_rules(build_stone_map()))
 
-    palette = nbt.get("palette", [])
-    for block in palette:
-        name = block["Name"]
-        if name in replacements:
-            new_val = replacements[name]
-            print(f"Replacing {name} -> {new_val}")
-            block["Name"] = String(new_val)  # keep as NBT string
+# -------------------------------
+# Output layout
+# -------------------------------
+def piece_path(rel):
+    """'/'-separated path of a woodland_mansion piece -> path of its pale oak copy."""
+    folder, name = posixpath.split(rel)
+    return posixpath.join(folder, name.replace("woodland_mansion", "paleoak_mansion"))
 
-    try:
-        nbt.save(out_path)
-    except Exception as e:
-        print(f"⚠️ Could not save {out_path}: {e}")
+# -------------------------------
+# Replace block IDs in a structure NBT
+# -------------------------------
+def reskin_nbt(path, out_path, rules, theme=THEME, stats=STATS, data=None):
+    return bool(reskin_targets(path, [(theme, out_path, rules)], stats, data, script="mansion_structure"))
 
 # -------------------------------
 # Main reskin function
 # -------------------------------
-def reskin_mansion(base_dir, out_dir):
-    wood_map = build_paleoak_wood_map()
-    stone_map = build_stone_map()
-    replacements = {**wood_map, **stone_map}
+def reskin_mansion(base_dir, out_dir, memory_budget=None):
+    rules = mansion_rules()
+    params = {"rules": rules.fingerprint, "gzip": OBJECT_STORE.options()}
 
-    if os.path.exists(out_dir):
+    # only rebuild pieces whose input or replacement map changed
+    manifest = BuildManifest(out_dir, SCRIPT_VERSION)
+    if manifest.fresh_start and os.path.exists(out_dir):
         shutil.rmtree(out_dir)
 
+    pending = {}  # in_path -> out_path
     for root, _, files in os.walk(base_dir):
-        rel_path = root.replace(base_dir, "")
-        new_root = os.path.join(out_dir, rel_path.lstrip(os.sep))
-        os.makedirs(new_root, exist_ok=True)
-
         for f in files:
             if f.endswith(".nbt"):
                 in_path = os.path.join(root, f)
-                out_path = os.path.join(new_root, f.replace("woodland_mansion", "paleoak_mansion"))
-                print(f"Processing {f}")
-                reskin_nbt(in_path, out_path, replacements)
+                rel = os.path.relpath(in_path, base_dir).replace(os.sep, "/")
+                out_path = os.path.normpath(os.path.join(out_dir, piece_path(rel)))
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                if not manifest.is_fresh(out_path, [in_path], params):
+                    pending[in_path] = out_path
+
+    # with a memory budget, pieces are read ahead on a thread, as many as fit
+    budget = MemoryBudget.from_mb(memory_budget)
+    sources = ((p, None) for p in pending) if budget is None else stream_templates(list(pending), budget)
+    for in_path, data in sources:
+        STATS.log(f"Processing {os.path.basename(in_path)}")
+        if reskin_nbt(in_path, pending[in_path], rules, data=data):
+            manifest.record(pending[in_path], [in_path], params)
+    if budget is not None:
+        print(budget.summary())
+
+    for path in manifest.prune():
+        print(f"Removed orphan {path}")
+    manifest.save()
 
 # -------------------------------
 # Example usage
 # -------------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reskin the woodland mansion into a pale oak mansion")
+    parser.add_argument("--memory-budget", type=float, metavar="MB",
+                        help="cap on template data held at once; streams files and backs off when full")
+    add_arguments(parser)
+    add_gzip_arguments(parser)
+    args = parser.parse_args()
+    configure(args.verbose, args.trace)
+    configure_gzip(args.gzip, args.reuse_source)
+
     reskin_mansion(
         base_dir="./data/minecraft/structures/woodland_mansion",
-        out_dir="./data/morevillages/structures/paleoak_mansion"
+        out_dir="./data/morevillages/structures/paleoak_mansion",
+        memory_budget=args.memory_budget,
     )
+    STATS.report("Pale oak mansion")
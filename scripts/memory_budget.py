@@ -0,0 +1,107 @@
+import os
+import struct
+import threading
+from queue import Queue
+
+# -------------------------------
+# Memory budget for template streaming
+# -------------------------------
+# A reskin holds a template's uncompressed NBT and the re-encoded copy it
+# is writing, so the memory a file needs is roughly twice its uncompressed
+# size. Gzip stores that size in its last four bytes, which lets us charge
+# a file against the budget before reading it.
+
+
+def template_cost(path):
+    """Estimated peak bytes held while reskinning the template at path."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as fh:
+        if fh.read(2) == b"\x1f\x8b" and size >= 18:
+            fh.seek(-4, os.SEEK_END)
+            size = struct.unpack("<I", fh.read(4))[0]
+    return 2 * size
+
+
+class MemoryBudget:
+    """
+    Bytes of template data allowed to be alive at once.
+    acquire() blocks (a back-off) until the cost fits; a single file larger
+    than the whole budget is still let through once nothing else is alive.
+    """
+
+    def __init__(self, limit_bytes):
+        self.limit = limit_bytes
+        self.in_use = 0
+        self.peak = 0
+        self.backoffs = 0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_mb(cls, megabytes):
+        return cls(int(megabytes * 2**20)) if megabytes else None
+
+    def fits(self, cost):
+        return self.in_use == 0 or self.in_use + cost <= self.limit
+
+    def acquire(self, cost):
+        with self._cond:
+            if not self.fits(cost):
+                self.backoffs += 1
+                while not self.fits(cost):
+                    self._cond.wait()
+            self.charge(cost)
+
+    def charge(self, cost):
+        """Count cost as alive without waiting (the caller already checked fits())."""
+        self.in_use += cost
+        self.peak = max(self.peak, self.in_use)
+
+    def release(self, cost):
+        with self._cond:
+            self.in_use -= cost
+            self._cond.notify_all()
+
+    def summary(self):
+        return (f"memory budget {self.limit / 2**20:.0f} MB: peak {self.peak / 2**20:.1f} MB charged, "
+                f"{self.backoffs} back-offs")
+
+
+def stream_templates(paths, budget):
+    """
+    Generator stage: read templates ahead on a thread and yield (path, raw bytes),
+    or (path, exception) for a file that couldn't be read.
+    Read-ahead stops while the budget is full; an item stays charged until
+    the next one is requested, so the caller must be done with it by then.
+    """
+    done = object()
+    queue = Queue()
+
+    def reader():
+        # errors travel to the consumer as the item's data, and `done` always
+        # follows, so a bad file can't leave the consumer waiting forever
+        try:
+            for path in paths:
+                cost = 0
+                try:
+                    cost = template_cost(path)
+                    budget.acquire(cost)
+                    with open(path, "rb") as fh:
+                        raw = fh.read()
+                except Exception as e:
+                    raw = e
+                queue.put((path, raw, cost))
+        finally:
+            queue.put(done)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    while True:
+        item = queue.get()
+        if item is done:
+            break
+        path, raw, cost = item
+        try:
+            yield path, raw
+        finally:
+            budget.release(cost)
+    thread.join()
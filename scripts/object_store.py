@@ -0,0 +1,196 @@
+import os
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+import structure_nbt
+
+# -------------------------------
+# Content-addressed object store
+# -------------------------------
+# Reskinned templates repeat a lot. A piece with nothing oak or cobblestone
+# in its palette comes out of every theme exactly as it went in, and one
+# payload can end up under several names. Outputs are keyed by the sha256
+# of their uncompressed NBT: a payload is gzipped once however many
+# outputs share it, and an output file that already holds that payload is
+# left alone instead of being written again.
+
+DEFAULT_BYTES = 32 * 2**20
+
+# what write() did with an output
+COMPRESSED, REUSED, SOURCE, KEPT = "compressed", "reused", "source", "kept"
+
+# -------------------------------
+# Compression profiles
+# -------------------------------
+# gzip level used for saved NBTs. "release" is what the committed outputs
+# and the shipped packs use. On the generated templates "dev" saves about
+# 20x faster for files about 20% larger, which suits iterating and CI.
+# gzip_profiles.py measures every profile per file.
+PROFILES = {"dev": 1, "default": 6, "release": 9}
+DEFAULT_PROFILE = "release"
+
+
+def _effort(level):
+    """0-2, from the XFL byte gzip writes: 4 for level 1, 2 for level 9, 0 for anything else."""
+    return 0 if level == 1 else 2 if level == 9 else 1
+
+
+_XFL_EFFORT = {4: 0, 0: 1, 2: 2}
+
+
+def payload_digest(raw):
+    return hashlib.sha256(raw).digest()
+
+
+def structure_payload(nbt, changed=True):
+    """
+    (uncompressed bytes, sha256) of a StructureNBT about to be saved.
+    An unchanged template (no palette entry renamed) is its source bytes,
+    so it is neither re-serialized nor hashed again for every theme.
+    """
+    if not changed:
+        return nbt.source, nbt.source_digest
+    raw = nbt.to_bytes()
+    return raw, payload_digest(raw)
+
+
+class ObjectStore:
+    """
+    Bounded LRU of gzipped payloads, keyed by sha256 of the uncompressed bytes.
+
+    gzipped() only compresses on a miss. write() also compares against the
+    file already at the path and skips the write when it holds the same
+    payload, gzipped at least as hard as `compresslevel` asks, so unchanged
+    outputs keep their bytes and mtime.
+
+    With `reuse_source`, a template nothing was renamed in is saved as the
+    gzip bytes of the file it was read from, without compressing at all.
+    """
+
+    def __init__(self, compresslevel=9, max_bytes=DEFAULT_BYTES, reuse_source=False):
+        self.max_bytes = max_bytes
+        self._objects = OrderedDict()
+        self._lock = threading.Lock()   # build_pack runs stages on threads
+        self.reset(compresslevel, reuse_source)
+
+    def reset(self, compresslevel=9, reuse_source=False):
+        self.compresslevel = compresslevel
+        self.reuse_source = reuse_source
+        self.clear()
+
+    def options(self):
+        """Settings to configure the store the same way in a worker process."""
+        return {"compresslevel": self.compresslevel, "reuse_source": self.reuse_source}
+
+    def gzipped(self, raw, digest=None):
+        """(gzip bytes of raw, True if they came from the store)."""
+        key = digest or payload_digest(raw)
+        data = self._get(key)
+        if data is not None:
+            return data, True
+        data = structure_nbt.gzip_bytes(raw, self.compresslevel)
+        self._put(key, data, compressed=True)
+        return data, False
+
+    def _get(self, key):
+        with self._lock:
+            data = self._objects.get(key)
+            if data is not None:
+                self._objects.move_to_end(key)
+                self.reused += 1
+                self.reused_bytes += len(data)
+            return data
+
+    def _put(self, key, data, compressed=False):
+        with self._lock:
+            self.compressed += compressed
+            if key in self._objects:
+                return
+            self._objects[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes and len(self._objects) > 1:
+                self._size -= len(self._objects.popitem(last=False)[1])
+
+    def write(self, path, raw, digest=None):
+        """
+        Save raw gzipped at path. Returns (bytes on disk, status): KEPT when
+        the file already held this payload, REUSED when its gzip came from
+        the store, COMPRESSED otherwise.
+        """
+        digest = digest or payload_digest(raw)
+        if _holds(path, digest, _effort(self.compresslevel)):
+            self._keep()
+            return os.path.getsize(path), KEPT
+        data, reused = self.gzipped(raw, digest)
+        with open(path, "wb") as fh:
+            fh.write(data)
+        return len(data), REUSED if reused else COMPRESSED
+
+    def save(self, nbt, path, changed=True, source_path=None):
+        """
+        write() for a StructureNBT; see structure_payload(). With reuse_source
+        and the file nbt was read from as source_path, an unchanged template
+        is written as that file's bytes (status SOURCE).
+        """
+        if changed or not self.reuse_source or source_path is None:
+            return self.write(path, *structure_payload(nbt, changed))
+        digest = nbt.source_digest
+        if _holds(path, digest, 0):
+            self._keep()
+            return os.path.getsize(path), KEPT
+        data = self._get(digest)
+        status = REUSED
+        if data is None:
+            with open(source_path, "rb") as fh:
+                data = fh.read()
+            if data[:2] != b"\x1f\x8b":   # stored uncompressed: nothing to reuse
+                return self.write(path, nbt.source, digest)
+            self._put(digest, data)
+            status = SOURCE
+        with open(path, "wb") as fh:
+            fh.write(data)
+        return len(data), status
+
+    def _keep(self):
+        # counters are updated under the lock: stages share the store from threads
+        with self._lock:
+            self.kept += 1
+
+    def clear(self):
+        with self._lock:
+            self._objects.clear()
+            self._size = 0
+            self.compressed = self.reused = self.reused_bytes = self.kept = 0
+
+
+def _holds(path, digest, effort):
+    """
+    True if the (gzipped) file at path decompresses to the payload with this
+    digest and its header says it was compressed with at least `effort`.
+    """
+    try:
+        with open(path, "rb") as fh:
+            data = fh.read()
+        if data[:2] == b"\x1f\x8b" and _XFL_EFFORT.get(data[8], 1) < effort:
+            return False
+        return payload_digest(structure_nbt.decompress(data)) == digest
+    except (OSError, EOFError, IndexError, gzip.BadGzipFile):
+        return False
+
+
+# one store per process; worker processes each get their own (see options())
+OBJECT_STORE = ObjectStore()
+
+
+def add_arguments(parser):
+    parser.add_argument("--gzip", choices=PROFILES, default=DEFAULT_PROFILE,
+                        help="compression profile for saved NBTs: dev (level 1, fast), default (6) "
+                             "or release (9, smallest)")
+    parser.add_argument("--reuse-source", action="store_true",
+                        help="save templates a theme changes nothing in as the vanilla file's gzip bytes")
+
+
+def configure(profile=DEFAULT_PROFILE, reuse_source=False):
+    OBJECT_STORE.reset(PROFILES[profile], reuse_source)
+    return OBJECT_STORE
@@ -0,0 +1,80 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import structure_nbt
+
+# -------------------------------
+# Rewritten-palette cache
+# -------------------------------
+# Many templates (lamp posts, decorations, street pieces) share the exact
+# same palette, and every theme rewrites it again for each of them. The
+# cache maps (palette fingerprint, rule set fingerprint) to the encoded,
+# rewritten palette, so a repeated palette costs one dict lookup and a
+# byte splice instead of a decode, a rename pass and an encode.
+
+DEFAULT_SIZE = 1024
+
+
+class PaletteCache:
+    """
+    Bounded LRU of rewritten palettes.
+
+    key: (sha1 of the palette's TAG_List payload as read, RuleSet.fingerprint)
+    value: (encoded rewritten payload, number of entries changed)
+    """
+
+    def __init__(self, max_entries=DEFAULT_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()   # build_pack runs stages on threads
+        self.hits = 0
+        self.misses = 0
+
+    def rewrite(self, nbt, rules):
+        """
+        Apply a block_rules.RuleSet to every palette of `nbt` (a StructureNBT),
+        always starting from its source palettes so the same object can be
+        rewritten for one theme after another. Returns (renamed, hits, misses).
+        """
+        rules_id = rules.fingerprint
+        renamed = hits = misses = 0
+        for index, source in enumerate(nbt.source_palettes):
+            key = (hashlib.sha1(source).digest(), rules_id)
+            with self._lock:
+                cached = self._entries.get(key)
+                if cached is not None:
+                    self._entries.move_to_end(key)
+            if cached is None:
+                misses += 1
+                # rewritten outside the lock; two threads missing on the same
+                # key both compute it, which is harmless
+                cached = self._rewrite_payload(source, rules)
+                with self._lock:
+                    self._entries[key] = cached
+                    if len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            else:
+                hits += 1
+            nbt.set_palette_payload(index, cached[0])
+            renamed += cached[1]
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        return renamed, hits, misses
+
+    @staticmethod
+    def _rewrite_payload(source, rules):
+        entries = structure_nbt.decode_palette(source)
+        renamed = sum(rules.apply(block) for block in entries)
+        # an untouched palette keeps its source bytes, so a template nothing
+        # was renamed in serializes back to exactly the file it came from
+        return (structure_nbt.encode_palette(entries) if renamed else source), renamed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+# one cache per process; worker processes each get their own
+PALETTE_CACHE = PaletteCache()
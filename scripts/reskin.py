@@ -0,0 +1,70 @@
+import os
+import time
+import structure_nbt
+from palette_cache import PALETTE_CACHE
+from object_store import OBJECT_STORE, REUSED, SOURCE, KEPT
+from build_stats import STATS
+
+# -------------------------------
+# Reskin one base NBT into several outputs
+# -------------------------------
+# The load -> palette rewrite -> save -> count loop shared by the village
+# and mansion scripts (saving files through OBJECT_STORE) and the zip
+# writer (saving zip entries), so counters and trace events stay the same
+# whichever one produced an output. A sink is anything with a
+# `compresslevel` and save(nbt, out, changed=, source_path=) returning
+# (bytes written, object_store status).
+
+
+def reskin_targets(path, targets, stats=STATS, data=None, sink=None, script="reskin"):
+    """
+    Load a base structure NBT once and save one reskinned copy per target.
+    targets: list of (theme, out, rules) tuples, rules being a RuleSet
+    data: the file's bytes when a streaming reader already read them
+          (or the exception reading them raised)
+    sink: where outputs go, OBJECT_STORE (files) by default
+    Returns the outs that were saved.
+    """
+    sink = OBJECT_STORE if sink is None else sink
+    saved = []
+    start = time.perf_counter()
+    try:
+        if isinstance(data, Exception):
+            raise data
+        nbt = structure_nbt.load(path, data)
+    except Exception as e:
+        stats.warn(f"Could not load {path}: {e}")
+        return saved
+    # the decode is shared, so each target is charged an equal slice of it
+    load_share = (time.perf_counter() - start) / len(targets)
+    bytes_in = os.path.getsize(path)
+
+    for theme, out, rules in targets:
+        event = {"load": load_share}
+        stats.add_time(theme, "load", load_share)
+        stats.sample_rss(theme)
+
+        # only the palette is rewritten (through the shared palette cache),
+        # every target starting again from the source palettes;
+        # blocks/entities are copied through as raw bytes
+        with stats.time(theme, "transform", event):
+            rewritten, hits, misses = PALETTE_CACHE.rewrite(nbt, rules)
+        stats.log(f"Renamed {rewritten} palette entries in {path} for {theme}")
+
+        # unchanged or repeated payloads skip serializing/compressing, and
+        # files that already hold the payload aren't rewritten
+        with stats.time(theme, "save", event):
+            try:
+                bytes_out, status = sink.save(nbt, out, changed=rewritten > 0, source_path=path)
+            except Exception as e:
+                stats.warn(f"Could not save {out}: {e}")
+                continue
+        saved.append(out)
+
+        stats.count(theme, files=1, palette=rewritten, bytes_in=bytes_in, bytes_out=bytes_out,
+                    cache_hits=hits, cache_misses=misses, noop=not rewritten,
+                    reused=status in (REUSED, SOURCE), kept=status == KEPT)
+        stats.trace(script=script, theme=theme, file=out, palette=rewritten,
+                    cache_hits=hits, bytes_in=bytes_in, bytes_out=bytes_out, object=status,
+                    gzip=sink.compresslevel, **event)
+    return saved
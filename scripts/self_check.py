@@ -0,0 +1,173 @@
+import sys
+import json
+import random
+import argparse
+from block_rules import Rule, RuleSet
+from build_stats import STATS, add_arguments, configure
+from themes import MOD_NS, VILLAGE_THEMES, biome_tag_id, biomes, structure_id, wood_rules
+from village_worldgen import StringRewriter, replace_in_string
+from validate_pack import PackIndex, validate
+
+# -------------------------------
+# Self-checks
+# -------------------------------
+# Quick checks of behaviour the build relies on but that the generated pack
+# doesn't show directly (a wrong rule order only bites on block states the
+# vanilla templates don't happen to use). Each check returns a list of
+# failure messages; run this after touching the code it covers.
+
+
+def _expect(failures, what, got, expected):
+    if got != expected:
+        failures.append(f"{what}: got {got!r}, expected {expected!r}")
+    else:
+        STATS.log(f"   ok {what}")
+
+
+# -------------------------------
+# Rule matching precedence
+# -------------------------------
+def check_rule_precedence():
+    """Exact names beat wildcards, larger `when` subsets beat smaller ones, later rules replace earlier ones."""
+    failures = []
+
+    # added wildcard-first and exact-first: the exact rule wins either way
+    for order in ("wildcard first", "exact first"):
+        rules = [Rule("minecraft:oak_*", "minecraft:birch_*"), Rule("minecraft:oak_log", "minecraft:stone")]
+        rules = RuleSet(rules if order == "wildcard first" else rules[::-1])
+        _expect(failures, f"exact beats wildcard ({order})",
+                rules.lookup("minecraft:oak_log")[1], "minecraft:stone")
+        _expect(failures, f"wildcard fills in the rest ({order})",
+                rules.lookup("minecraft:oak_door")[1], "minecraft:birch_door")
+
+    # an exact rule beats a wildcard even when the wildcard's `when` is larger
+    rules = RuleSet([Rule("minecraft:*_slab", "minecraft:stone", when={"type": "double"}),
+                     Rule("minecraft:oak_slab", "minecraft:birch_slab")])
+    _expect(failures, "exact beats a more specific wildcard",
+            rules.lookup("minecraft:oak_slab", {"type": "double"})[1], "minecraft:birch_slab")
+
+    # the largest `when` that fits wins, whatever order the rules came in
+    rules = RuleSet([Rule("minecraft:oak_slab", "minecraft:a"),
+                     Rule("minecraft:oak_slab", "minecraft:c", when={"type": "double", "waterlogged": "true"}),
+                     Rule("minecraft:oak_slab", "minecraft:b", when={"type": "double"})])
+    for props, expected in (({"type": "double", "waterlogged": "true"}, "minecraft:c"),
+                            ({"type": "double", "waterlogged": "false"}, "minecraft:b"),
+                            ({"type": "top"}, "minecraft:a"),
+                            (None, "minecraft:a")):
+        _expect(failures, f"largest fitting when for {props}", rules.lookup("minecraft:oak_slab", props)[1], expected)
+
+    # same match and `when`: the later rule replaces the earlier one
+    rules = RuleSet.from_map({"minecraft:cobblestone": "minecraft:a"}, {"minecraft:cobblestone": "minecraft:b"})
+    _expect(failures, "later map wins", rules.lookup("minecraft:cobblestone")[1], "minecraft:b")
+
+    # the wood family: every oak building block, stripped forms, natural blocks kept
+    rules = RuleSet(wood_rules("morevillages:palm"))
+    for old, new in (("minecraft:oak_planks", "morevillages:palm_planks"),
+                     ("minecraft:oak_hanging_sign", "morevillages:palm_hanging_sign"),
+                     ("minecraft:stripped_oak_log", "morevillages:stripped_palm_log"),
+                     ("minecraft:oak_leaves", "minecraft:oak_leaves"),
+                     ("minecraft:oak_sapling", "minecraft:oak_sapling"),
+                     ("minecraft:dark_oak_planks", "minecraft:dark_oak_planks")):
+        _expect(failures, f"wood family {old}", rules.lookup(old)[1], new)
+    return failures
+
+
+# -------------------------------
+# Single-scan pool string rewriting
+# -------------------------------
+# (base, theme) pairs where the seven replace passes interact the most:
+# names that contain, prefix or overlap each other or the fixed pieces
+_ADVERSARIAL_PAIRS = [
+    ("plains", "plains_ii"), ("plains", "_plains"), ("snowy", "snowy"), ("desert", "village"),
+    ("village", "v"), ("taiga", "a"), ("a", "ab"), ("a", "aa"), ("aa", "a"), ("ab", "ba"),
+    ("la", "al"), ("s", "s_s"),
+]
+
+
+def check_string_rewriter(strings=5000, seed=0):
+    """
+    StringRewriter gives the same result as replace_in_string on strings
+    glued together from the rule patterns, their replacements and pieces of
+    them, for every registry (base, theme) pair and the adversarial ones.
+    """
+    failures = []
+    rng = random.Random(seed)
+    pairs = list(dict.fromkeys([(mats["base"], theme) for theme, mats in VILLAGE_THEMES.items()] +
+                               _ADVERSARIAL_PAIRS))
+    fast = total = 0
+    for base, theme in pairs:
+        rewriter = StringRewriter(base, theme)
+        pieces = sorted({"minecraft:", f"{MOD_NS}:", "village", "/", "_", ":", "x",
+                         base, theme, base[:1], base[1:], theme[:1], theme[1:]} |
+                        set(rewriter._table) | set(rewriter._table.values()))
+        for _ in range(strings):
+            s = "".join(rng.choice(pieces) for _ in range(rng.randint(1, 7)))
+            total += 1
+            fast += not (rewriter._risky and rewriter._risky.search(s))
+            got, expected = rewriter(s), replace_in_string(s, base, theme)
+            if got != expected:
+                failures.append(f"{base} -> {theme} on {s!r}: got {got!r}, expected {expected!r}")
+    STATS.log(f"   {total} strings over {len(pairs)} pairs, {fast / total:.0%} on the single-scan path")
+    return failures
+
+
+# -------------------------------
+# Pack validation of the village biome tags
+# -------------------------------
+def _village_pack(skip_tag=None):
+    """PackIndex of a minimal pack: every theme's structure JSON and biome tag, except skip_tag's tag."""
+    index = PackIndex()
+    for theme in VILLAGE_THEMES:
+        structure = {"type": "minecraft:jigsaw", "biomes": "#" + biome_tag_id(theme)}
+        index.add(MOD_NS, f"worldgen/structure/{structure_id(theme).split(':', 1)[1]}.json",
+                  lambda data=json.dumps(structure): data)
+        if theme != skip_tag:
+            index.add("minecraft", f"tags/worldgen/biome/{biome_tag_id(theme).split(':', 1)[1]}.json",
+                      lambda data=json.dumps({"values": biomes(theme)}): data)
+    return index
+
+
+def check_pack_validation():
+    """validate_pack reports a village pack missing one theme's has_structure biome tag."""
+    failures = []
+    result = validate(_village_pack())
+    _expect(failures, "complete pack: dangling", result["dangling"], [])
+    _expect(failures, "complete pack: mismatched", result["mismatched"], [])
+
+    theme = next(iter(VILLAGE_THEMES))
+    tag = biome_tag_id(theme)
+    result = validate(_village_pack(skip_tag=theme))
+    _expect(failures, f"missing {tag}: dangling", [(kind, rid) for kind, rid, _ in result["dangling"]],
+            [("biome_tag", tag)])
+    _expect(failures, f"missing {tag}: mismatched", result["mismatched"], [(tag, "is missing")])
+    return failures
+
+
+CHECKS = {
+    "rule_precedence": check_rule_precedence,
+    "string_rewriter": check_string_rewriter,
+    "pack_validation": check_pack_validation,
+}
+
+
+def run_checks(names=None):
+    """Run the named checks (all by default); returns the number of failures."""
+    failures = 0
+    for name in names or CHECKS:
+        found = CHECKS[name]()
+        for message in found:
+            print(f"❌ {name}: {message}")
+        print(f"{'✅' if not found else '❌'} {name}: {len(found)} failures")
+        failures += len(found)
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check build behaviour the generated pack doesn't show directly")
+    parser.add_argument("--only", action="append", choices=CHECKS, metavar="CHECK",
+                        help=f"run just this check (repeatable): {', '.join(CHECKS)}")
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args.verbose, args.trace)
+
+    sys.exit(1 if run_checks(args.only) else 0)
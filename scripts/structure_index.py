@@ -0,0 +1,358 @@
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+import structure_nbt
+from build_stats import STATS, add_arguments, configure
+from mansion_structure import piece_path
+from themes import group_themes_by_base, themed_template
+
+# -------------------------------
+# Structure index
+# -------------------------------
+# One SQLite file describing every vanilla and generated template: its
+# palette, how many blocks use each palette state and, for generated
+# templates, which states the reskin replaced. Files are re-read only when
+# their mtime/size changed and re-decoded only when their sha256 did, so
+# keeping the index current costs a stat per file; queries then answer
+# from the index instead of opening the templates.
+#
+#   python scripts/structure_index.py contains 'minecraft:oak_*' --theme cherry
+#   python scripts/structure_index.py totals minecraft:cobblestone
+
+DEFAULT_DB = "./structure_index.sqlite"
+
+# bump when the tables or what goes in them change; the index is rebuilt
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    pack TEXT NOT NULL,            -- 'vanilla' or 'generated'
+    theme TEXT NOT NULL,           -- generated: theme; vanilla: base (plains, woodland_mansion...)
+    source TEXT,                   -- generated: the vanilla template it was reskinned from
+    source_sha256 TEXT,            -- sha256 the source had when replacements were computed
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    blocks INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS palette (
+    file_id INTEGER NOT NULL,
+    palette INTEGER NOT NULL,      -- which palette, for templates with several
+    idx INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    state TEXT NOT NULL,           -- 'facing=north,half=top', '' without properties
+    count INTEGER NOT NULL         -- blocks using this entry
+);
+CREATE TABLE IF NOT EXISTS replacements (
+    file_id INTEGER NOT NULL,
+    from_name TEXT NOT NULL,
+    from_state TEXT NOT NULL,
+    to_name TEXT NOT NULL,
+    to_state TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS palette_file ON palette (file_id);
+CREATE INDEX IF NOT EXISTS palette_name ON palette (name);
+CREATE INDEX IF NOT EXISTS replacements_file ON replacements (file_id);
+"""
+
+
+def connect(db_path=DEFAULT_DB):
+    """Open (creating or rebuilding it on a schema change) the index database."""
+    conn = sqlite3.connect(db_path)
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        for table in ("files", "palette", "replacements"):
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.executescript(SCHEMA)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    return conn
+
+# -------------------------------
+# Template layout
+# -------------------------------
+def _theme_of(rel):
+    """'village/cherry/houses/x.nbt' -> 'cherry', 'paleoak_mansion/x.nbt' -> 'paleoak_mansion'."""
+    parts = rel.split("/")
+    return parts[1] if parts[0] == "village" and len(parts) > 2 else parts[0]
+
+
+def source_map(vanilla_dir, generated_dir):
+    """
+    {generated template path: vanilla template path}, using the same renames
+    as village_structure.py and mansion_structure.py (themed_template, piece_path).
+    """
+    sources = {}
+    village_in = os.path.join(vanilla_dir, "village")
+    for base, themes in group_themes_by_base().items():
+        base_path = os.path.join(village_in, base)
+        for path, rel in _templates(base_path):
+            for theme in themes:
+                sources[os.path.normpath(os.path.join(generated_dir, "village", themed_template(rel, base, theme)))] = path
+
+    mansion_in = os.path.join(vanilla_dir, "woodland_mansion")
+    for path, rel in _templates(mansion_in):
+        sources[os.path.normpath(os.path.join(generated_dir, "paleoak_mansion", piece_path(rel)))] = path
+    return sources
+
+# -------------------------------
+# Decoding
+# -------------------------------
+def _state(entry):
+    props = entry.get("Properties")
+    if not isinstance(props, dict):
+        return ""
+    return ",".join(f"{k}={v}" for k, v in sorted(props.items()) if isinstance(v, str))
+
+
+def describe(raw):
+    """([(palette, idx, name, state, count)], total blocks) for uncompressed template bytes."""
+    nbt = structure_nbt.StructureNBT(raw)
+    counts = structure_nbt.block_state_counts(raw)
+    rows = []
+    for number, palette in enumerate(nbt.palettes):
+        for idx, entry in enumerate(palette):
+            rows.append((number, idx, entry.get("Name", ""), _state(entry), counts.get(idx, 0)))
+    return rows, sum(counts.values())
+
+
+def replacements(source_rows, rows):
+    """{(from name, from state, to name, to state): blocks} between two templates' palette rows."""
+    by_key = {(r[0], r[1]): r for r in source_rows}
+    changed = {}
+    for number, idx, name, state, count in rows:
+        before = by_key.get((number, idx))
+        if before is None or (before[2], before[3]) == (name, state):
+            continue
+        key = (before[2], before[3], name, state)
+        changed[key] = changed.get(key, 0) + count
+    return changed
+
+# -------------------------------
+# Incremental update
+# -------------------------------
+class StructureIndex:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = {path: dict(zip(("id", "mtime_ns", "size", "sha256", "source_sha256"), rest))
+                     for path, *rest in conn.execute(
+                         "SELECT path, id, mtime_ns, size, sha256, source_sha256 FROM files")}
+        self.counts = dict.fromkeys(("unchanged", "touched", "indexed", "removed"), 0)
+
+    def _palette(self, file_id):
+        return self.conn.execute("SELECT palette, idx, name, state, count FROM palette WHERE file_id = ?",
+                                 (file_id,)).fetchall()
+
+    def update_file(self, path, pack, theme, source=None):
+        """Bring one template's rows up to date; returns its sha256."""
+        st = os.stat(path)
+        row = self.rows.get(path)
+        source_sha = self.rows[source]["sha256"] if source in self.rows else None
+        if row and (row["mtime_ns"], row["size"]) == (st.st_mtime_ns, st.st_size) \
+                and row["source_sha256"] == source_sha:
+            self.counts["unchanged"] += 1
+            return row["sha256"]
+
+        with open(path, "rb") as fh:
+            data = fh.read()
+        sha = hashlib.sha256(data).hexdigest()
+        if row and row["sha256"] == sha and row["source_sha256"] == source_sha:
+            # touched but identical: only the stat changed
+            self.conn.execute("UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?",
+                              (st.st_mtime_ns, st.st_size, row["id"]))
+            row.update(mtime_ns=st.st_mtime_ns, size=st.st_size)
+            self.counts["touched"] += 1
+            return sha
+
+        palette, blocks = describe(structure_nbt.decompress(data))
+        if row:
+            self._delete(row["id"])
+        file_id = self.conn.execute(
+            "INSERT INTO files (path, pack, theme, source, source_sha256, mtime_ns, size, sha256, blocks) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, pack, theme, source, source_sha, st.st_mtime_ns, st.st_size, sha, blocks)).lastrowid
+        self.conn.executemany("INSERT INTO palette VALUES (?, ?, ?, ?, ?, ?)",
+                              [(file_id,) + r for r in palette])
+        if source_sha is not None:
+            changed = replacements(self._palette(self.rows[source]["id"]), palette)
+            self.conn.executemany("INSERT INTO replacements VALUES (?, ?, ?, ?, ?, ?)",
+                                  [(file_id,) + key + (count,) for key, count in changed.items()])
+        self.rows[path] = {"id": file_id, "mtime_ns": st.st_mtime_ns, "size": st.st_size,
+                           "sha256": sha, "source_sha256": source_sha}
+        self.counts["indexed"] += 1
+        STATS.log(f"Indexed {path}: {len(palette)} palette entries, {blocks} blocks")
+        return sha
+
+    def _delete(self, file_id):
+        for table in ("palette", "replacements"):
+            self.conn.execute(f"DELETE FROM {table} WHERE file_id = ?", (file_id,))
+        self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def prune(self, seen):
+        for path in set(self.rows) - seen:
+            self._delete(self.rows.pop(path)["id"])
+            self.counts["removed"] += 1
+
+
+def _templates(root):
+    for dirpath, dirs, files in os.walk(root):
+        dirs.sort()
+        for f in sorted(files):
+            if f.endswith(".nbt"):
+                path = os.path.normpath(os.path.join(dirpath, f))
+                yield path, os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def update_index(conn, base_dir="./data/minecraft", out_dir="./data/morevillages"):
+    """Index vanilla templates first (generated ones are compared against them), then generated ones."""
+    start = time.perf_counter()
+    vanilla_dir = os.path.join(base_dir, "structures")
+    generated_dir = os.path.join(out_dir, "structures")
+    index = StructureIndex(conn)
+    seen = set()
+    try:
+        for path, rel in _templates(vanilla_dir):
+            try:
+                index.update_file(path, "vanilla", _theme_of(rel))
+                seen.add(path)
+            except Exception as e:
+                STATS.warn(f"Could not index {path}: {e}")
+        sources = source_map(vanilla_dir, generated_dir)
+        for path, rel in _templates(generated_dir):
+            try:
+                index.update_file(path, "generated", _theme_of(rel), sources.get(path))
+                seen.add(path)
+            except Exception as e:
+                STATS.warn(f"Could not index {path}: {e}")
+        index.prune(seen)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    counts = index.counts
+    STATS.log(f"Index: {counts['indexed']} indexed, {counts['touched']} touched, "
+              f"{counts['unchanged']} unchanged, {counts['removed']} removed "
+              f"in {time.perf_counter() - start:.2f}s")
+    return counts
+
+# -------------------------------
+# Queries
+# -------------------------------
+def _filters(theme=None, pack=None):
+    sql, params = "", []
+    if theme:
+        sql += " AND f.theme = ?"
+        params.append(theme)
+    if pack:
+        sql += " AND f.pack = ?"
+        params.append(pack)
+    return sql, params
+
+
+def contains(conn, pattern, theme=None, pack=None):
+    """Templates with palette entries whose name matches the glob `pattern` (e.g. 'minecraft:oak_*')."""
+    where, params = _filters(theme, pack)
+    return conn.execute(
+        "SELECT f.path, group_concat(DISTINCT p.name), sum(p.count) FROM palette p JOIN files f ON f.id = p.file_id "
+        f"WHERE p.name GLOB ? AND p.palette = 0{where} GROUP BY f.id ORDER BY f.path",
+        [pattern] + params).fetchall()
+
+
+def totals(conn, pattern, pack=None):
+    """Blocks whose name matches `pattern`, summed per pack and theme."""
+    where, params = _filters(pack=pack)
+    return conn.execute(
+        "SELECT f.pack, f.theme, sum(p.count), count(DISTINCT f.id) FROM palette p JOIN files f ON f.id = p.file_id "
+        f"WHERE p.name GLOB ? AND p.palette = 0{where} GROUP BY f.pack, f.theme ORDER BY f.pack, f.theme",
+        [pattern] + params).fetchall()
+
+
+def changes(conn, theme=None, path=None):
+    """Replacements applied to generated templates, summed over a theme or one file."""
+    where, params = _filters(theme)
+    if path:
+        where += " AND f.path = ?"
+        params.append(os.path.normpath(path))
+    return conn.execute(
+        "SELECT r.from_name, r.from_state, r.to_name, r.to_state, sum(r.count), count(DISTINCT f.id) "
+        f"FROM replacements r JOIN files f ON f.id = r.file_id WHERE 1{where} "
+        "GROUP BY r.from_name, r.from_state, r.to_name, r.to_state ORDER BY sum(r.count) DESC",
+        params).fetchall()
+
+
+def _block(name, state):
+    return f"{name}[{state}]" if state else name
+
+
+def _print_rows(command, rows):
+    if command == "contains":
+        for path, names, count in rows:
+            print(f"{path}  {count} blocks  {names.replace(',', ', ')}")
+    elif command == "totals":
+        print(f"{'pack':<11}{'theme':<20}{'blocks':>9}{'files':>7}")
+        for pack, theme, count, files in rows:
+            print(f"{pack:<11}{theme:<20}{count:>9}{files:>7}")
+    elif command == "changes":
+        for from_name, from_state, to_name, to_state, count, files in rows:
+            print(f"{count:>7} blocks in {files:>4} files  "
+                  f"{_block(from_name, from_state)} -> {_block(to_name, to_state)}")
+    else:
+        for row in rows:
+            print("\t".join("" if v is None else str(v) for v in row))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index vanilla and generated structure templates in SQLite and query them")
+    parser.add_argument("--db", default=DEFAULT_DB, help="index database")
+    parser.add_argument("--base-dir", default="./data/minecraft", help="vanilla data")
+    parser.add_argument("--out-dir", default="./data/morevillages", help="generated data")
+    parser.add_argument("--no-update", action="store_true", help="query the index as it is, without checking files")
+    add_arguments(parser)
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("update", help="bring the index up to date (the default)")
+    query = commands.add_parser("contains", help="templates whose palette has blocks matching a glob")
+    query.add_argument("pattern", help="block name glob, e.g. 'minecraft:oak_*'")
+    query.add_argument("--theme")
+    query.add_argument("--pack", choices=("vanilla", "generated"))
+    query = commands.add_parser("totals", help="blocks matching a glob, summed per theme")
+    query.add_argument("pattern")
+    query.add_argument("--pack", choices=("vanilla", "generated"))
+    query = commands.add_parser("changes", help="replacements applied to a theme or one file")
+    query.add_argument("path", nargs="?")
+    query.add_argument("--theme")
+    query = commands.add_parser("sql", help="run a read-only SQL query against the index")
+    query.add_argument("query")
+    args = parser.parse_args()
+    configure(args.verbose, args.trace)
+
+    conn = connect(args.db)
+    if not args.no_update:
+        counts = update_index(conn, args.base_dir, args.out_dir)
+        if args.command in (None, "update"):
+            print(f"✅ {args.db}: {counts['indexed']} indexed, {counts['touched'] + counts['unchanged']} up to date, "
+                  f"{counts['removed']} removed")
+    if args.command in (None, "update"):
+        sys.exit(0)
+
+    start = time.perf_counter()
+    if args.command == "contains":
+        rows = contains(conn, args.pattern, args.theme, args.pack)
+    elif args.command == "totals":
+        rows = totals(conn, args.pattern, args.pack)
+    elif args.command == "changes":
+        rows = changes(conn, args.theme, args.path)
+    else:
+        conn.execute("PRAGMA query_only = ON")
+        try:
+            rows = conn.execute(args.query).fetchall()
+        except sqlite3.Error as e:
+            print(f"❌ query failed: {e}")
+            sys.exit(1)
+    elapsed = time.perf_counter() - start
+    _print_rows(args.command, rows)
+    print(f"({len(rows)} rows in {elapsed * 1000:.1f} ms)")
@@ -0,0 +1,309 @@
+import gzip
+import struct
+import hashlib
+
+# -------------------------------
+# Palette-only structure NBT reader/writer
+# -------------------------------
+# Structure templates are gzipped NBT whose root compound holds `size`,
+# `blocks`, `entities`, `palette` (or `palettes`) and `DataVersion`.
+# Reskinning only ever touches palette entries, so instead of building a
+# full nbtlib tree we walk the root compound, decode just the palette
+# lists and keep every other tag as the raw bytes it was read from.
+
+TAG_END, TAG_INT, TAG_STRING, TAG_LIST, TAG_COMPOUND = 0, 3, 8, 9, 10
+
+_FIXED_SIZE = {1: 1, 2: 2, 3: 4, 4: 8, 5: 4, 6: 8}   # byte, short, int, long, float, double
+_ARRAY_ITEM_SIZE = {7: 1, 11: 4, 12: 8}              # byte/int/long arrays
+
+_u16 = struct.Struct(">H")
+_i32 = struct.Struct(">i")
+
+PALETTE_KEYS = ("palette", "palettes")
+
+
+class RawTag:
+    """A palette entry tag we don't interpret, kept as its payload bytes."""
+    __slots__ = ("type", "payload")
+
+    def __init__(self, tag_type, payload):
+        self.type = tag_type
+        self.payload = payload
+
+    def __eq__(self, other):
+        return isinstance(other, RawTag) and (self.type, self.payload) == (other.type, other.payload)
+
+
+def _skip(buf, pos, tag):
+    """Return the offset just past a payload of type `tag` starting at `pos`."""
+    size = _FIXED_SIZE.get(tag)
+    if size is not None:
+        return pos + size
+    if tag == TAG_STRING:
+        return pos + 2 + _u16.unpack_from(buf, pos)[0]
+    item_size = _ARRAY_ITEM_SIZE.get(tag)
+    if item_size is not None:
+        return pos + 4 + item_size * _i32.unpack_from(buf, pos)[0]
+    if tag == TAG_LIST:
+        item = buf[pos]
+        count = _i32.unpack_from(buf, pos + 1)[0]
+        pos += 5
+        size = _FIXED_SIZE.get(item)
+        if size is not None:
+            return pos + size * count
+        for _ in range(count):
+            pos = _skip(buf, pos, item)
+        return pos
+    if tag == TAG_COMPOUND:
+        while True:
+            child = buf[pos]
+            if child == TAG_END:
+                return pos + 1
+            pos = _skip(buf, pos + 3 + _u16.unpack_from(buf, pos + 1)[0], child)
+    raise ValueError(f"unknown NBT tag type {tag} at offset {pos}")
+
+
+def _read_string(buf, pos):
+    length = _u16.unpack_from(buf, pos)[0]
+    end = pos + 2 + length
+    return bytes(buf[pos + 2:end]).decode("utf-8", "surrogatepass"), end
+
+
+def _write_string(out, value):
+    data = value.encode("utf-8", "surrogatepass")
+    out.append(_u16.pack(len(data)))
+    out.append(data)
+
+
+def _read_compound(buf, pos):
+    """Decode a (small) compound: strings -> str, compounds -> dict, anything else -> RawTag."""
+    entry = {}
+    while True:
+        tag = buf[pos]
+        if tag == TAG_END:
+            return entry, pos + 1
+        name, pos = _read_string(buf, pos + 1)
+        if tag == TAG_STRING:
+            entry[name], pos = _read_string(buf, pos)
+        elif tag == TAG_COMPOUND:
+            entry[name], pos = _read_compound(buf, pos)
+        else:
+            end = _skip(buf, pos, tag)
+            entry[name] = RawTag(tag, bytes(buf[pos:end]))
+            pos = end
+
+
+def _write_compound(out, entry):
+    for name, value in entry.items():
+        if isinstance(value, str):
+            out.append(bytes((TAG_STRING,)))
+            _write_string(out, name)
+            _write_string(out, value)
+        elif isinstance(value, dict):
+            out.append(bytes((TAG_COMPOUND,)))
+            _write_string(out, name)
+            _write_compound(out, value)
+        else:
+            out.append(bytes((value.type,)))
+            _write_string(out, name)
+            out.append(value.payload)
+    out.append(bytes((TAG_END,)))
+
+
+def _read_palette(buf, pos):
+    """Read a TAG_List of palette compounds; returns (entries, end)."""
+    item = buf[pos]
+    count = _i32.unpack_from(buf, pos + 1)[0]
+    pos += 5
+    if count and item != TAG_COMPOUND:
+        raise ValueError(f"palette list holds tag type {item}, expected compounds")
+    entries = []
+    for _ in range(count):
+        entry, pos = _read_compound(buf, pos)
+        entries.append(entry)
+    return entries, pos
+
+
+def _write_palette(out, entries):
+    out.append(bytes((TAG_COMPOUND if entries else TAG_END,)))
+    out.append(_i32.pack(len(entries)))
+    for entry in entries:
+        _write_compound(out, entry)
+
+
+def decode_palette(payload):
+    """Palette entry dicts from a palette's TAG_List payload."""
+    return _read_palette(memoryview(payload), 0)[0]
+
+
+def encode_palette(entries):
+    """TAG_List payload for a list of palette entry dicts."""
+    out = []
+    _write_palette(out, entries)
+    return b"".join(out)
+
+
+class StructureNBT:
+    """
+    A structure template split into raw byte chunks and palettes.
+
+    `palettes` is a list of palettes, each a list of entry dicts such as
+    {"Name": "minecraft:oak_stairs", "Properties": {"facing": "north"}}.
+    Templates with a single `palette` have one; shipwreck-style templates
+    with `palettes` have several. Edit the entries in place, then save().
+
+    Palettes are only decoded when `palettes` is first used. Until then
+    each one is kept as its TAG_List payload, `source_palettes` always
+    holds the payloads as read, and set_palette_payload() swaps in an
+    already encoded palette without decoding anything. `source` is the
+    uncompressed file as read.
+    """
+
+    def __init__(self, raw):
+        buf = memoryview(raw)
+        if buf[0] != TAG_COMPOUND:
+            raise ValueError("structure NBT root is not a compound")
+
+        self.source = raw
+        self._source_digest = None
+        self.source_palettes = []
+        self._slots = []   # per palette: payload bytes, or the decoded entry list
+        self._parts = []   # bytes chunks and ("palette", index) / ("palettes", [indices]) markers
+
+        pos = 3 + _u16.unpack_from(buf, 1)[0]
+        start = 0
+        while True:
+            tag = buf[pos]
+            if tag == TAG_END:
+                break
+            name, payload = _read_string(buf, pos + 1)
+            if tag == TAG_LIST and name in PALETTE_KEYS:
+                self._parts.append(bytes(buf[start:payload]))
+                if name == "palette":
+                    pos = _skip(buf, payload, TAG_LIST)
+                    self._parts.append(("palette", len(self._slots)))
+                    self._add_palette(buf[payload:pos])
+                else:
+                    # list of palettes: TAG_List of TAG_List of compounds
+                    count = _i32.unpack_from(buf, payload + 1)[0]
+                    pos = payload + 5
+                    indices = []
+                    for _ in range(count):
+                        end = _skip(buf, pos, TAG_LIST)
+                        indices.append(len(self._slots))
+                        self._add_palette(buf[pos:end])
+                        pos = end
+                    self._parts.append(("palettes", indices))
+                start = pos
+            else:
+                pos = _skip(buf, payload, tag)
+        self._parts.append(bytes(buf[start:]))
+
+    def _add_palette(self, payload):
+        payload = bytes(payload)
+        if payload[0] not in (TAG_COMPOUND, TAG_END) and _i32.unpack_from(payload, 1)[0]:
+            raise ValueError(f"palette list holds tag type {payload[0]}, expected compounds")
+        self.source_palettes.append(payload)
+        self._slots.append(payload)
+
+    @property
+    def source_digest(self):
+        """sha256 of `source`, computed once."""
+        if self._source_digest is None:
+            self._source_digest = hashlib.sha256(self.source).digest()
+        return self._source_digest
+
+    @property
+    def palettes(self):
+        for index, slot in enumerate(self._slots):
+            if isinstance(slot, bytes):
+                self._slots[index] = decode_palette(slot)
+        return self._slots
+
+    def set_palette_payload(self, index, payload):
+        """Replace palette `index` with an encoded TAG_List payload (see encode_palette)."""
+        self._slots[index] = payload
+
+    def _palette_payload(self, index):
+        slot = self._slots[index]
+        return slot if isinstance(slot, bytes) else encode_palette(slot)
+
+    def to_bytes(self):
+        """Serialize back to uncompressed NBT."""
+        out = []
+        for part in self._parts:
+            if isinstance(part, bytes):
+                out.append(part)
+            elif part[0] == "palette":
+                out.append(self._palette_payload(part[1]))
+            else:
+                indices = part[1]
+                out.append(bytes((TAG_LIST if indices else TAG_END,)))
+                out.append(_i32.pack(len(indices)))
+                for index in indices:
+                    out.append(self._palette_payload(index))
+        return b"".join(out)
+
+    def to_gzip(self, compresslevel=9):
+        return gzip_bytes(self.to_bytes(), compresslevel)
+
+    def save(self, path, compresslevel=9):
+        with open(path, "wb") as fh:
+            fh.write(self.to_gzip(compresslevel))
+
+
+def block_state_counts(raw):
+    """
+    {palette index: number of blocks} from the `blocks` list of uncompressed
+    NBT, read straight from the bytes without decoding the block compounds.
+    """
+    buf = memoryview(raw)
+    pos = 3 + _u16.unpack_from(buf, 1)[0]
+    while buf[pos] != TAG_END:
+        tag = buf[pos]
+        name, payload = _read_string(buf, pos + 1)
+        if tag == TAG_LIST and name == "blocks":
+            return _count_states(buf, payload)
+        pos = _skip(buf, payload, tag)
+    return {}
+
+
+def _count_states(buf, pos):
+    counts = {}
+    count = _i32.unpack_from(buf, pos + 1)[0] if buf[pos] == TAG_COMPOUND else 0
+    pos += 5
+    for _ in range(count):
+        while True:
+            child = buf[pos]
+            if child == TAG_END:
+                pos += 1
+                break
+            value = pos + 3 + _u16.unpack_from(buf, pos + 1)[0]
+            if child == TAG_INT and buf[pos + 3:value] == b"state":
+                state = _i32.unpack_from(buf, value)[0]
+                counts[state] = counts.get(state, 0) + 1
+            pos = _skip(buf, value, child)
+    return counts
+
+
+def gzip_bytes(raw, compresslevel=9):
+    # mtime=0 keeps output bytes reproducible between runs
+    return gzip.compress(raw, compresslevel=compresslevel, mtime=0)
+
+
+def decompress(data):
+    """Uncompressed NBT bytes from a file's contents, gzipped or not."""
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    return data
+
+
+def read_raw(path):
+    """Return the uncompressed NBT bytes of a (usually gzipped) file."""
+    with open(path, "rb") as fh:
+        return decompress(fh.read())
+
+
+def load(path, data=None):
+    """Load a template from path, or from its already read file contents."""
+    return StructureNBT(read_raw(path) if data is None else decompress(data))
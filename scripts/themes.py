@@ -0,0 +1,118 @@
+import os
+import json
+from functools import lru_cache
+from block_rules import RuleSet, family_rules, map_rules
+
+# -------------------------------
+# Village theme registry
+# -------------------------------
+# Single source of truth for every script, loaded from themes.json: which
+# vanilla village each theme is built from (base), its wood and stone
+# family, and the biomes it spawns in. Anything derived from a theme
+# (block rules, IDs) is worked out on first use and memoized, so scripts
+# can import this freely and ask for it per file without rebuilding it.
+
+REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "themes.json")
+
+
+def load_registry(path=REGISTRY_PATH):
+    with open(path, "r", encoding="utf-8") as fh:
+        registry = json.load(fh)
+    for theme, mats in registry["themes"].items():
+        missing = {"wood", "stone", "base", "biomes"} - set(mats)
+        if missing:
+            raise ValueError(f"theme {theme!r} in {path} is missing: {', '.join(sorted(missing))}")
+    return registry
+
+
+_REGISTRY = load_registry()
+
+MOD_NS = _REGISTRY["mod_ns"]  # output namespace used for new structure references
+STONE_FAMILIES = _REGISTRY["stone_families"]
+VILLAGE_THEMES = _REGISTRY["themes"]
+
+# -------------------------------
+# Wood replacement rules
+# -------------------------------
+# Themes are built from oak villages. Every oak block becomes the theme's
+# wood except the natural ones, which not every wood has (bamboo has no
+# leaves, palm has no vanilla sapling).
+BASE_WOOD = "minecraft:oak"
+NATURAL_WOOD_BLOCKS = ("leaves", "sapling")
+
+
+def wood_rules(wood_id):
+    """
+    wood_id: string like 'minecraft:cherry' or 'morevillages:palm'
+    """
+    return family_rules(BASE_WOOD, wood_id, keep=NATURAL_WOOD_BLOCKS)
+
+# -------------------------------
+# Build stone replacement map
+# -------------------------------
+def build_stone_map(stone):
+    if stone not in STONE_FAMILIES:
+        raise ValueError(f"unknown stone family {stone!r} (expected one of: {', '.join(STONE_FAMILIES)})")
+    family = STONE_FAMILIES[stone]
+    return {
+        "minecraft:cobblestone": f"minecraft:{family['cobblestone']}",
+        "minecraft:stone_bricks": f"minecraft:{family['stone_bricks']}",
+        "minecraft:mossy_cobblestone": f"minecraft:{family['mossy_cobblestone']}",
+        "minecraft:mossy_stone_bricks": f"minecraft:{family['mossy_stone_bricks']}",
+        "minecraft:stone_slab": f"minecraft:{family['slab']}",
+        "minecraft:stone_stairs": f"minecraft:{family['stairs']}",
+        "minecraft:stone_wall": f"minecraft:{family['wall']}",
+    }
+
+# -------------------------------
+# Derived data (memoized)
+# -------------------------------
+@lru_cache(maxsize=None)
+def compile_rules(wood, stone):
+    """Compiled block rules for a wood + stone pair; shared by every theme using the pair."""
+    return RuleSet(wood_rules(wood) + map_rules(build_stone_map(stone)))
+
+
+def theme_rules(theme):
+    """Compiled block rules (wood + stone) for one theme."""
+    mats = VILLAGE_THEMES[theme]
+    return compile_rules(mats["wood"], mats["stone"])
+
+
+def structure_id(theme):
+    return f"{MOD_NS}:village_{theme}"
+
+
+def biome_tag_id(theme):
+    return f"minecraft:has_structure/village_{theme}"
+
+
+def biomes(theme):
+    return VILLAGE_THEMES[theme]["biomes"]
+
+
+@lru_cache(maxsize=4096)
+def pool_id(theme, vanilla_pool):
+    """'minecraft:village/<base>/houses' -> '<MOD_NS>:village/<theme>/houses' for the theme's base."""
+    base_prefix = f"minecraft:village/{VILLAGE_THEMES[theme]['base']}"
+    if vanilla_pool != base_prefix and not vanilla_pool.startswith(base_prefix + "/"):
+        return vanilla_pool
+    return f"{MOD_NS}:village/{theme}" + vanilla_pool[len(base_prefix):]
+
+
+def themed_template(rel, base, theme):
+    """
+    Where a theme's copy of a vanilla village template goes, relative to the
+    village structures folder. rel is the template's '/'-separated path under
+    its base's folder; the base name becomes the theme in folders and file
+    name: 'houses/plains_small_house_1.nbt' -> 'cherry/houses/cherry_small_house_1.nbt'.
+    """
+    return f"{theme}/{rel.replace(base, theme)}"
+
+
+def group_themes_by_base(themes=None):
+    """{base: [theme, ...]} in theme order, so each base is read once for all its themes."""
+    groups = {}
+    for theme, mats in (VILLAGE_THEMES if themes is None else themes).items():
+        groups.setdefault(mats["base"], []).append(theme)
+    return groups
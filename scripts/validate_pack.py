@@ -0,0 +1,289 @@
+import os
+import re
+import gzip
+import sys
+import json
+import time
+import zipfile
+import argparse
+from build_stats import STATS, add_arguments, configure
+from themes import MOD_NS, VILLAGE_THEMES, biome_tag_id, biomes, pool_id, structure_id
+
+# -------------------------------
+# Resource kinds
+# -------------------------------
+# folder under data/<namespace>/ -> kind of resource its files define
+KINDS = {
+    "structures": "template",
+    "structure": "template",
+    "worldgen/structure": "structure",
+    "worldgen/structure_set": "structure_set",
+    "worldgen/template_pool": "template_pool",
+    "worldgen/processor_list": "processor_list",
+    "worldgen/configured_feature": "configured_feature",
+    "worldgen/placed_feature": "placed_feature",
+    "tags/worldgen/biome": "biome_tag",
+    "tags/worldgen/structure": "structure_tag",
+}
+# longest folder first, so worldgen/structure_set isn't taken for worldgen/structure
+_KIND_DIRS = sorted(KINDS, key=len, reverse=True)
+
+# kinds nothing has to point at: they are what the game loads by itself
+ROOT_KINDS = ("structure_set", "biome_tag", "structure_tag")
+
+# tags the pack ships in the minecraft namespace (has_structure/village_<theme>,
+# the #village structure tag): references to a tag in a folder the pack
+# ships tags in are checked against the pack, not left to vanilla
+SHIPPED_TAG_KINDS = ("biome_tag", "structure_tag")
+
+# built-in IDs that are never files
+BUILTIN = {("template_pool", "minecraft:empty"), ("processor_list", "minecraft:empty")}
+
+# jigsaw blocks store their target pool as an NBT string tag named "pool"
+_JIGSAW_POOL = re.compile(rb"\x08\x00\x04pool")
+
+# the build scripts write everything under data/morevillages, but the tags and
+# the villages structure_set belong to the minecraft namespace (see datapack_zip.py)
+GENERATED_MINECRAFT_DIRS = ("tags/", "worldgen/structure_set/")
+
+# -------------------------------
+# Pack sources
+# -------------------------------
+def _split_kind(rel):
+    """'worldgen/template_pool/village/x.json' -> ('template_pool', 'village/x', '.json')"""
+    for folder in _KIND_DIRS:
+        if rel.startswith(folder + "/"):
+            path, ext = os.path.splitext(rel[len(folder) + 1:])
+            return KINDS[folder], path, ext
+    return None, None, None
+
+
+def _read_file(path):
+    def read():
+        with open(path, "rb") as fh:
+            return fh.read()
+    return read
+
+
+def iter_pack(path):
+    """
+    Yield (namespace, rel path, read()) for every file of a pack, which may be
+    a datapack folder (with data/), a datapack zip or the generated output
+    tree (data/morevillages as written by the build scripts).
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for name in zf.namelist():
+                parts = name.split("/", 2)
+                if len(parts) == 3 and parts[0] == "data" and not name.endswith("/"):
+                    yield parts[1], parts[2], (lambda name=name: zf.read(name))
+        return
+
+    data_dir = os.path.join(path, "data")
+    if os.path.isdir(data_dir):
+        for namespace in sorted(os.listdir(data_dir)):
+            ns_dir = os.path.join(data_dir, namespace)
+            for root, _, files in os.walk(ns_dir):
+                for f in files:
+                    full = os.path.join(root, f)
+                    yield namespace, os.path.relpath(full, ns_dir).replace(os.sep, "/"), _read_file(full)
+        return
+
+    for root, _, files in os.walk(path):
+        for f in files:
+            full = os.path.join(root, f)
+            rel = os.path.relpath(full, path).replace(os.sep, "/")
+            namespace = "minecraft" if rel.startswith(GENERATED_MINECRAFT_DIRS) else MOD_NS
+            yield namespace, rel, _read_file(full)
+
+# -------------------------------
+# Index
+# -------------------------------
+class PackIndex:
+    """
+    Every resource ID a pack defines plus every reference between them,
+    collected in a single pass over the files.
+    ids:  {kind: {id: source file}}
+    refs: [(kind, id, source file)]
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.refs = []
+        self.biome_tags = {}   # tag id -> values, to compare with the theme registry
+        self.files = 0
+
+    def add(self, namespace, rel, read):
+        kind, path, ext = _split_kind(rel)
+        if kind is None or ext != (".nbt" if kind == "template" else ".json"):
+            return
+        rid = f"{namespace}:{path}"
+        source = f"data/{namespace}/{rel}"
+        self.ids.setdefault(kind, {})[rid] = source
+        self.files += 1
+        try:
+            if ext == ".nbt":
+                self._scan_template(read(), source)
+            else:
+                self._scan_json(kind, rid, json.loads(read()), source)
+        except Exception as e:
+            STATS.warn(f"Could not read {source}: {e}")
+
+    def ref(self, kind, value, source):
+        if isinstance(value, str):
+            if value.startswith("#"):
+                kind, value = kind + "_tag", value[1:]
+            if ":" not in value:
+                value = "minecraft:" + value
+            self.refs.append((kind, value, source))
+
+    def _scan_template(self, data, source):
+        raw = data if data[:2] != b"\x1f\x8b" else gzip.decompress(data)
+        for m in _JIGSAW_POOL.finditer(raw):
+            length = int.from_bytes(raw[m.end():m.end() + 2], "big")
+            self.ref("template_pool", raw[m.end() + 2:m.end() + 2 + length].decode("utf-8", "replace"), source)
+
+    def _scan_json(self, kind, rid, data, source):
+        if kind == "structure":
+            self.ref("template_pool", data.get("start_pool"), source)
+            self.ref("biome", data.get("biomes"), source)
+        elif kind == "structure_set":
+            for entry in data.get("structures", []):
+                self.ref("structure", entry.get("structure"), source)
+        elif kind == "template_pool":
+            self.ref("template_pool", data.get("fallback"), source)
+            for entry in data.get("elements", []):
+                self._scan_element(entry.get("element", {}), source)
+        elif kind == "placed_feature":
+            self.ref("configured_feature", data.get("feature"), source)
+        elif kind == "structure_tag":
+            for value in data.get("values", []):
+                self.ref("structure", value if isinstance(value, str) else value.get("id"), source)
+        elif kind == "biome_tag":
+            self.biome_tags[rid] = data.get("values", [])
+
+    def _scan_element(self, element, source):
+        element_type = element.get("element_type", "")
+        if element_type.endswith("single_pool_element"):
+            self.ref("template", element.get("location"), source)
+            self.ref("processor_list", element.get("processors"), source)
+        elif element_type.endswith("feature_pool_element"):
+            self.ref("placed_feature", element.get("feature"), source)
+        elif element_type.endswith("list_pool_element"):
+            for child in element.get("elements", []):
+                self._scan_element(child, source)
+
+
+def build_index(paths):
+    index = PackIndex()
+    for path in paths:
+        for namespace, rel, read in iter_pack(path):
+            index.add(namespace, rel, read)
+    return index
+
+# -------------------------------
+# Checks
+# -------------------------------
+def validate(index, mod_ns=MOD_NS):
+    """
+    Resolve every reference against the index. Returns a dict with
+    dangling: [(kind, id, source)]   references into a namespace the pack
+                                     defines (or a tag folder it ships) that
+                                     don't resolve
+    external: {(kind, id)}           references into namespaces the pack
+                                     doesn't define (vanilla), not checked
+    unused:   [(kind, id, source)]   IDs the pack defines that nothing uses
+    mismatched: [(tag id, message)]  village biome tags missing or differing from VILLAGE_THEMES
+    unthemed: [(id, themed id, source)]  themed templates whose jigsaws still target
+                                         the vanilla pool although a themed copy exists
+    """
+    defined = {rid.split(":", 1)[0] for by_id in index.ids.values() for rid in by_id}
+    tag_folders = {(kind, rid.rsplit("/", 1)[0]) for kind in SHIPPED_TAG_KINDS
+                   for rid in index.ids.get(kind, ()) if "/" in rid}
+    pools = index.ids.get("template_pool", {})
+    used = set()
+    result = {"dangling": [], "external": set(), "unused": [], "mismatched": [], "unthemed": []}
+
+    for kind, rid, source in index.refs:
+        used.add((kind, rid))
+        if rid in index.ids.get(kind, ()) or (kind, rid) in BUILTIN or kind == "biome":
+            continue
+        namespace = rid.split(":", 1)[0]
+        if (namespace in defined and namespace != "minecraft") or (kind, rid.rsplit("/", 1)[0]) in tag_folders:
+            result["dangling"].append((kind, rid, source))
+            continue
+        result["external"].add((kind, rid))
+        theme = _template_theme(source, mod_ns) if kind == "template_pool" else None
+        if theme is not None and pool_id(theme, rid) in pools:
+            result["unthemed"].append((rid, pool_id(theme, rid), source))
+
+    for kind, by_id in sorted(index.ids.items()):
+        if kind in ROOT_KINDS:
+            continue
+        for rid, source in sorted(by_id.items()):
+            if rid.startswith(mod_ns + ":") and (kind, rid) not in used:
+                result["unused"].append((kind, rid, source))
+
+    # a village pack has to ship every theme's biome tag (the mansion pack has none)
+    structures = index.ids.get("structure", {})
+    village_pack = any(structure_id(theme) in structures for theme in VILLAGE_THEMES)
+    for theme in VILLAGE_THEMES if village_pack else ():
+        tag = biome_tag_id(theme)
+        if tag not in index.biome_tags:
+            result["mismatched"].append((tag, "is missing"))
+        elif index.biome_tags[tag] != biomes(theme):
+            result["mismatched"].append((tag, f"has {index.biome_tags[tag]}, themes.json says {biomes(theme)}"))
+    return result
+
+
+def _template_theme(source, mod_ns):
+    """'data/<mod_ns>/structures/village/<theme>/...nbt' -> theme, None for anything else."""
+    parts = source.split("/")
+    if len(parts) > 5 and parts[1] == mod_ns and parts[2] == "structures" and parts[3] == "village" \
+            and parts[4] in VILLAGE_THEMES:
+        return parts[4]
+    return None
+
+
+def validate_paths(paths, list_unused=False):
+    """Index and check the given packs; prints a summary and returns the number of errors."""
+    start = time.perf_counter()
+    index = build_index(paths)
+    result = validate(index)
+    elapsed = time.perf_counter() - start
+
+    for kind, rid, source in result["dangling"]:
+        print(f"❌ dangling {kind} {rid} (referenced from {source})")
+    for kind, rid in sorted(result["external"]):
+        STATS.log(f"   external {kind} {rid}")
+    for tag, message in result["mismatched"]:
+        print(f"❌ biome tag {tag} {message}")
+    if result["unthemed"]:
+        STATS.warn(f"{len(result['unthemed'])} jigsaw targets in themed templates still use the vanilla pool "
+                   f"(e.g. {result['unthemed'][0][0]} -> {result['unthemed'][0][1]})")
+        for rid, themed, source in result["unthemed"]:
+            STATS.log(f"   unthemed pool {rid} -> {themed} ({source})")
+    if result["unused"]:
+        STATS.warn(f"{len(result['unused'])} unused IDs" +
+                   ("" if list_unused else " (list them with --list-unused)"))
+        if list_unused:
+            for kind, rid, source in result["unused"]:
+                print(f"   unused {kind} {rid} ({source})")
+
+    errors = len(result["dangling"]) + len(result["mismatched"])
+    ids = sum(len(by_id) for by_id in index.ids.values())
+    print(f"{'✅' if not errors else '❌'} {ids} IDs, {len(index.refs)} references "
+          f"({len(result['external'])} external) checked in {elapsed:.2f}s: {errors} errors")
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check cross-references in a generated pack")
+    parser.add_argument("paths", nargs="*", default=["./data/morevillages"],
+                        help="datapack folders, datapack zips or the generated output tree")
+    parser.add_argument("--list-unused", action="store_true", help="print every unused ID")
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args.verbose, args.trace)
+
+    sys.exit(1 if validate_paths(args.paths, args.list_unused) else 0)
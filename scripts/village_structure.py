@@ -1,180 +1,189 @@
 import os
 import shutil
-from nbtlib import load, File
-from nbtlib import String
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from reskin import reskin_targets
+from object_store import OBJECT_STORE, add_arguments as add_gzip_arguments, configure as configure_gzip
+from memory_budget import MemoryBudget, stream_templates, template_cost
+from build_manifest import BuildManifest
+from build_stats import STATS, BuildStats, add_arguments, configure
+from themes import VILLAGE_THEMES, group_themes_by_base, theme_rules, themed_template
+
+# bump when the reskin logic changes so every output is rebuilt
+SCRIPT_VERSION = 3
 
 # -------------------------------
-# Build wood replacement map
+# Replace block IDs in a structure NBT
+# -------------------------------
+def reskin_nbt(path, out_path, rules, theme="-", stats=STATS, data=None):
+    return bool(reskin_nbt_themes(path, [(theme, out_path, rules)], stats, data))
+
 # -------------------------------
-def build_wood_map(wood_id):
+# Reskin one base NBT into several themes
+# -------------------------------
+def reskin_nbt_themes(path, targets, stats=STATS, data=None):
     """
-    wood_id: string like 'minecraft:cherry' or 'morevillages:palm'
+    Load a base structure NBT once and save one reskinned copy per target.
+    targets: list of (theme, out_path, rules) tuples, rules being a RuleSet
+    data: the file's bytes when a streaming reader already read them
+    Returns the out_paths that were saved.
     """
-    namespace, wood = wood_id.split(":")
-    return {
-        "minecraft:oak_planks": f"{namespace}:{wood}_planks",
-        "minecraft:oak_log": f"{namespace}:{wood}_log",
-        "minecraft:stripped_oak_log": f"{namespace}:stripped_{wood}_log",
-        "minecraft:oak_wood": f"{namespace}:{wood}_wood",
-        "minecraft:stripped_oak_wood": f"{namespace}:stripped_{wood}_wood",
-        "minecraft:oak_stairs": f"{namespace}:{wood}_stairs",
-        "minecraft:oak_slab": f"{namespace}:{wood}_slab",
-        "minecraft:oak_fence": f"{namespace}:{wood}_fence",
-        "minecraft:oak_fence_gate": f"{namespace}:{wood}_fence_gate",
-        "minecraft:oak_door": f"{namespace}:{wood}_door",
-        "minecraft:oak_trapdoor": f"{namespace}:{wood}_trapdoor",
-        "minecraft:oak_button": f"{namespace}:{wood}_button",
-        "minecraft:oak_pressure_plate": f"{namespace}:{wood}_pressure_plate",
-        "minecraft:oak_sign": f"{namespace}:{wood}_sign",
-        "minecraft:oak_hanging_sign": f"{namespace}:{wood}_hanging_sign",
-    }
+    return reskin_targets(path, targets, stats, data, script="village_structure")
 
 
-# -------------------------------
-# Stone family definitions
-# -------------------------------
-STONE_FAMILIES = {
-    "stone": {
-        "cobblestone": "cobblestone",
-        "stone_bricks": "stone_bricks",
-        "mossy_cobblestone": "mossy_cobblestone",
-        "mossy_stone_bricks": "mossy_stone_bricks",
-        "slab": "stone_slab",
-        "stairs": "stone_stairs",
-        "wall": "cobblestone_wall",
-    },
-    "deepslate": {
-        "cobblestone": "cobbled_deepslate",
-        "stone_bricks": "deepslate_bricks",
-        "mossy_cobblestone": "deepslate_tiles",
-        "mossy_stone_bricks": "deepslate_tiles",
-        "slab": "deepslate_slab",
-        "stairs": "deepslate_stairs",
-        "wall": "deepslate_wall",
-    },
-    "granite": {
-        "cobblestone": "granite",
-        "stone_bricks": "polished_granite",
-        "mossy_cobblestone": "granite",
-        "mossy_stone_bricks": "polished_granite",
-        "slab": "granite_slab",
-        "stairs": "granite_stairs",
-        "wall": "granite_wall",
-    },
-    "diorite": {
-        "cobblestone": "diorite",
-        "stone_bricks": "polished_diorite",
-        "mossy_cobblestone": "diorite",
-        "mossy_stone_bricks": "polished_diorite",
-        "slab": "diorite_slab",
-        "stairs": "diorite_stairs",
-        "wall": "diorite_wall",
-    },
-    "andesite": {
-        "cobblestone": "andesite",
-        "stone_bricks": "polished_andesite",
-        "mossy_cobblestone": "andesite",
-        "mossy_stone_bricks": "polished_andesite",
-        "slab": "andesite_slab",
-        "stairs": "andesite_stairs",
-        "wall": "andesite_wall",
-    },
-}
-
-def build_stone_map(stone):
-    family = STONE_FAMILIES[stone]
-    return {
-        "minecraft:cobblestone": f"minecraft:{family['cobblestone']}",
-        "minecraft:stone_bricks": f"minecraft:{family['stone_bricks']}",
-        "minecraft:mossy_cobblestone": f"minecraft:{family['mossy_cobblestone']}",
-        "minecraft:mossy_stone_bricks": f"minecraft:{family['mossy_stone_bricks']}",
-        "minecraft:stone_slab": f"minecraft:{family['slab']}",
-        "minecraft:stone_stairs": f"minecraft:{family['stairs']}",
-        "minecraft:stone_wall": f"minecraft:{family['wall']}",
-    }
+def _reskin_job(job, data=None):
+    # top-level so ProcessPoolExecutor can pickle it; counters travel back
+    # with the result so they aren't lost in (or double counted by) workers
+    path, targets, options, store_options = job
+    stats = BuildStats(**options)
+    if OBJECT_STORE.options() != store_options:
+        OBJECT_STORE.reset(**store_options)
+    saved = reskin_nbt_themes(path, targets, stats, data)
+    stats.close()
+    return path, saved, stats.snapshot()
 
-# -------------------------------
-# Replace block IDs in a structure NBT
-# -------------------------------
-def reskin_nbt(path, out_path, replacements):
-    try:
-        nbt = load(path)
-    except Exception as e:
-        print(f"⚠️ Could not load {path}: {e}")
-        return
 
-    palette = nbt.get("palette", [])
-    for block in palette:
-        name = block["Name"]
-        if name in replacements:
-            new_val = replacements[name]
-            print(f"Replacing {name} -> {new_val}")
-            block["Name"] = String(new_val)  # ✅ wrap in NBT string
+def _pool_context():
+    # build_pack starts this pool from a stage thread while other stages run
+    # on threads; a forked worker could inherit a lock (STATS, OBJECT_STORE,
+    # PALETTE_CACHE) that one of them holds, so workers never fork from here
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
 
-    try:
-        nbt.save(out_path)
-    except Exception as e:
-        print(f"⚠️ Could not save {out_path}: {e}")
 
-# -------------------------------
-# Full theme mapping
-# -------------------------------
-VILLAGE_THEMES = {
-    "cherry":        {"wood": "minecraft:cherry",   "stone": "deepslate", "base": "taiga"},
-    "birch":         {"wood": "minecraft:birch",    "stone": "diorite",   "base": "plains"},
-    "dark_oak":      {"wood": "minecraft:dark_oak", "stone": "granite",   "base": "savanna"},
-    "pale_oak":      {"wood": "minecraft:pale_oak", "stone": "andesite",  "base": "savanna"},
-    "bamboo_jungle": {"wood": "minecraft:bamboo",   "stone": "stone",     "base": "plains"},
-    "mangrove":      {"wood": "minecraft:mangrove", "stone": "stone",     "base": "plains"},
-    "beach":         {"wood": "morevillages:palm",  "stone": "sandstone", "base": "plains"},
-    "stony_shore":   {"wood": "minecraft:oak",      "stone": "andesite",  "base": "plains"},
-    "badlands":      {"wood": "minecraft:oak",      "stone": "granite",   "base": "desert"},
-    "ice_spikes":    {"wood": "minecraft:spruce",   "stone": "stone",     "base": "snowy"},
-}
+def _run_jobs(jobs, workers, budget=None):
+    """
+    Yield (in_path, saved, stats snapshot) per job, serially or over a process pool.
+    With a MemoryBudget, serial runs stream files through a read-ahead
+    generator and pooled runs stop submitting while the files in flight
+    would exceed it.
+    """
+    items = [(path, targets, STATS.options(), OBJECT_STORE.options()) for path, targets in jobs.items()]
+    if workers == 1:
+        if budget is None:
+            yield from map(_reskin_job, items)
+        else:
+            for item, (_, data) in zip(items, stream_templates([item[0] for item in items], budget)):
+                yield _reskin_job(item, data)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as pool:
+        if budget is None:
+            yield from pool.map(_reskin_job, items, chunksize=8)
+            return
+        running = {}
+        for item in items:
+            try:
+                cost = template_cost(item[0])
+            except OSError:
+                cost = 0   # the job itself reports the unreadable file
+            if not budget.fits(cost):
+                budget.backoffs += 1
+                while not budget.fits(cost):
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        budget.release(running.pop(future))
+                        yield future.result()
+            budget.charge(cost)
+            running[pool.submit(_reskin_job, item)] = cost
+        for future in list(running):
+            budget.release(running.pop(future))
+            yield future.result()
+
+def _params(rules):
+    # the compression settings are part of an output: switching profile rebuilds
+    return {"rules": rules.fingerprint, "gzip": OBJECT_STORE.options()}
 
 # -------------------------------
 # Main reskin function
 # -------------------------------
-def reskin_villages(base_dir, out_dir):
-    for theme, mats in VILLAGE_THEMES.items():
-        base = mats["base"]
-
-        wood_map = build_wood_map(mats["wood"])
-        stone_map = build_stone_map(mats["stone"]) if mats["stone"] in STONE_FAMILIES else {}
-        replacements = {**wood_map, **stone_map}
+def reskin_villages(base_dir, out_dir, workers=None, memory_budget=None):
+    """
+    Reskin every base village folder into each of VILLAGE_THEMES.
+    Themes are grouped by base, so each base tree is walked once and each
+    base NBT is decoded once and saved for every theme that uses it;
+    files are spread over a process pool of `workers` processes
+    (None = one per CPU, 1 = run serially in this process).
+    memory_budget (MB) caps the template data alive at once; see memory_budget.py.
+
+    Outputs whose base NBT, block rules and SCRIPT_VERSION are unchanged
+    since the last run are left alone; outputs no longer produced are deleted.
+    """
+    manifest = BuildManifest(out_dir, SCRIPT_VERSION)
+    jobs = {}  # in_path -> [(theme, out_path, rules), ...]
+    skipped = 0
 
+    for base, themes in group_themes_by_base(VILLAGE_THEMES).items():
         base_path = os.path.join(base_dir, base)
-        theme_dir = os.path.join(out_dir, theme)
 
-        print(f"\n--- Processing theme: {theme} (base: {base}) ---")
-        print("Base path:", os.path.abspath(base_path))
+        STATS.log(f"\n--- Processing base: {base} (themes: {', '.join(themes)}) ---")
+        STATS.log(f"Base path: {os.path.abspath(base_path)}")
 
         if not os.path.exists(base_path):
-            print("!! Base path does not exist, skipping")
+            STATS.warn(f"Base path does not exist, skipping: {os.path.abspath(base_path)}")
             continue
 
-        if os.path.exists(theme_dir):
-            shutil.rmtree(theme_dir)
+        rules_by_theme = {}
+        for theme in themes:
+            rules_by_theme[theme] = theme_rules(theme)
 
-        for root, _, files in os.walk(base_path):
-            rel_path = root.replace(base_path, "").replace(base, theme)
-            new_root = os.path.join(theme_dir, rel_path.lstrip(os.sep))
-            os.makedirs(new_root, exist_ok=True)
+            theme_dir = os.path.join(out_dir, theme)
+            if manifest.fresh_start and os.path.exists(theme_dir):
+                shutil.rmtree(theme_dir)
 
+        # walk the base tree once and fan every file out to all of its themes
+        for root, _, files in os.walk(base_path):
             for f in files:
-                if f.endswith(".nbt"):
-                    print("Found NBT:", f)
-                    new_name = f.replace(base, theme)
-                    in_path = os.path.join(root, f)
-                    out_path = os.path.join(new_root, new_name)
-                    reskin_nbt(in_path, out_path, replacements)
+                if not f.endswith(".nbt"):
+                    continue
+                in_path = os.path.join(root, f)
+                rel = os.path.relpath(in_path, base_path).replace(os.sep, "/")
+                for theme, rules in rules_by_theme.items():
+                    out_path = os.path.normpath(os.path.join(out_dir, themed_template(rel, base, theme)))
+                    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                    if manifest.is_fresh(out_path, [in_path], _params(rules)):
+                        skipped += 1
+                        continue
+                    jobs.setdefault(in_path, []).append((theme, out_path, rules))
+
+    print(f"Reskinning {len(jobs)} base NBTs into {sum(len(t) for t in jobs.values())} files"
+          f" ({skipped} up to date, gzip level {OBJECT_STORE.compresslevel})")
+
+    budget = MemoryBudget.from_mb(memory_budget)
+    for in_path, saved, snapshot in _run_jobs(jobs, workers, budget):
+        STATS.merge(snapshot)
+        rules_for = {out_path: rules for _, out_path, rules in jobs[in_path]}
+        for out_path in saved:
+            manifest.record(out_path, [in_path], _params(rules_for[out_path]))
+        STATS.log(f"Done: {in_path}")
+
+    if budget is not None:
+        print(budget.summary())
+
+    for path in manifest.prune():
+        print("Removed orphan:", path)
+    manifest.save()
 
 
 # -------------------------------
 # Example usage
 # -------------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reskin vanilla villages into every theme")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU, 1 = serial)")
+    parser.add_argument("--memory-budget", type=float, metavar="MB",
+                        help="cap on template data held at once; streams files and backs off when full")
+    add_arguments(parser)
+    add_gzip_arguments(parser)
+    args = parser.parse_args()
+    configure(args.verbose, args.trace)
+    configure_gzip(args.gzip, args.reuse_source)
+
     reskin_villages(
-        base_dir="./data/minecraft/structures/village",  
-        out_dir="./data/morevillages/structures/village"
+        base_dir="./data/minecraft/structures/village",
+        out_dir="./data/morevillages/structures/village",
+        workers=args.workers,
+        memory_budget=args.memory_budget,
     )
+    STATS.report("Village structures")
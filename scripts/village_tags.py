@@ -1,61 +1,85 @@
 import os
 import json
 import shutil
+import argparse
+from build_manifest import BuildManifest
+from build_stats import STATS, add_arguments, configure
+from json_output import JSON, add_arguments as add_json_arguments, configure as configure_json
+from themes import MOD_NS, VILLAGE_THEMES, biomes, structure_id
+
+# bump when the tag layout changes so every tag is rewritten
+SCRIPT_VERSION = 1
+
+
+def add_structure_tag_values(struct_tag):
+    """Add every theme's village structure ID to the #village structure tag."""
+    for theme in VILLAGE_THEMES:
+        struct_id = structure_id(theme)
+        if struct_id not in struct_tag["values"]:
+            struct_tag["values"].append(struct_id)
+            STATS.log(f"Added structure ID to tag: {struct_id}")
+    return struct_tag
 
-VILLAGE_THEMES = {
-    "cherry":        {"biomes": ["minecraft:cherry_grove"]},
-    "birch":         {"biomes": ["minecraft:birch_forest", "minecraft:old_growth_birch_forest"]},
-    "dark_oak":      {"biomes": ["minecraft:dark_forest"]},
-    "pale_oak":      {"biomes": ["minecraft:pale_oak_forest"]},  # custom biome if you added one
-    "bamboo_jungle": {"biomes": ["minecraft:bamboo_jungle"]},
-    "mangrove":      {"biomes": ["minecraft:mangrove_swamp"]},
-    "beach":         {"biomes": ["minecraft:beach"]},
-    "stony_shore":   {"biomes": ["minecraft:stony_shore"]},
-    "badlands":      {"biomes": ["minecraft:badlands", "minecraft:eroded_badlands", "minecraft:wooded_badlands"]},
-    "ice_spikes":    {"biomes": ["minecraft:ice_spikes"]},
-}
-
-MOD_NS = "morevillages"
 
 def reskin_tags(base_dir="./data/minecraft", out_dir="./data/morevillages"):
-    # Biome tags folder
-    biome_tag_dir = os.path.join(out_dir, "tags", "worldgen", "biome", "has_structure")
+    tags_dir = os.path.join(out_dir, "tags")
+
+    # only rewrite tags whose theme changed, and drop those of removed themes
+    manifest = BuildManifest(tags_dir, SCRIPT_VERSION)
+
+    # Biome tags folder (every file in it is one of ours)
+    biome_tag_dir = os.path.join(tags_dir, "worldgen", "biome", "has_structure")
+    if manifest.fresh_start and os.path.exists(biome_tag_dir):
+        shutil.rmtree(biome_tag_dir)
     os.makedirs(biome_tag_dir, exist_ok=True)
 
     # Structure tag (village.json)
     struct_tag_in = os.path.join(base_dir, "tags", "worldgen", "structure", "village.json")
-    struct_tag_out = os.path.join(out_dir, "tags", "worldgen", "structure", "village.json")
-    os.makedirs(os.path.dirname(struct_tag_out), exist_ok=True)
-
-    # Copy vanilla structure tag first
-    shutil.copy2(struct_tag_in, struct_tag_out)
-    with open(struct_tag_out, "r", encoding="utf-8") as f:
-        struct_tag = json.load(f)
+    struct_tag_out = os.path.join(tags_dir, "worldgen", "structure", "village.json")
 
     # Process each theme
-    for theme, mats in VILLAGE_THEMES.items():
+    for theme in VILLAGE_THEMES:
         # --- biome tag ---
         biome_file = os.path.join(biome_tag_dir, f"village_{theme}.json")
-        biome_json = {"values": mats["biomes"]}
-        with open(biome_file, "w", encoding="utf-8") as f:
-            json.dump(biome_json, f, indent=2)
-        print(f"Created biome tag: {biome_file}")
+        biome_params = {"biomes": biomes(theme), "json": JSON.mode}
+        if manifest.is_fresh(biome_file, [], biome_params):
+            STATS.log(f"Biome tag up to date: {biome_file}")
+            continue
+        biome_json = {"values": biomes(theme)}
+        with STATS.time(theme, "save"):
+            size = JSON.write(biome_file, biome_json)
+        manifest.record(biome_file, [], biome_params)
+        STATS.count(theme, files=1, bytes_out=size)
+        STATS.log(f"Created biome tag: {biome_file}")
 
-        # --- structure tag ---
-        struct_id = f"{MOD_NS}:village_{theme}"
-        if struct_id not in struct_tag["values"]:
-            struct_tag["values"].append(struct_id)
-            print(f"Added structure ID to tag: {struct_id}")
+    # --- structure tag: the vanilla one plus every theme's structure ---
+    struct_params = {"themes": list(VILLAGE_THEMES), "mod_ns": MOD_NS, "json": JSON.mode}
+    if not manifest.is_fresh(struct_tag_out, [struct_tag_in], struct_params):
+        with open(struct_tag_in, "r", encoding="utf-8") as f:
+            struct_tag = json.load(f)
+        add_structure_tag_values(struct_tag)
+        os.makedirs(os.path.dirname(struct_tag_out), exist_ok=True)
+        JSON.write(struct_tag_out, struct_tag)
+        manifest.record(struct_tag_out, [struct_tag_in], struct_params)
 
-    # Save updated structure tag
-    with open(struct_tag_out, "w", encoding="utf-8") as f:
-        json.dump(struct_tag, f, indent=2)
+    for path in manifest.prune():
+        print(f"Removed orphan: {path}")
+    manifest.save()
 
     print("\n✅ Tags generated/updated at:", os.path.abspath(out_dir))
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate biome and structure tags for every village theme")
+    add_arguments(parser)
+    add_json_arguments(parser)
+    args = parser.parse_args()
+    configure(args.verbose, args.trace)
+    configure_json(args.compact, args.json_report)
+
     reskin_tags(
         base_dir="./data/minecraft",
         out_dir="./data/morevillages"
     )
+    STATS.report("Tags")
+    JSON.report()
@@ -1,22 +1,23 @@
 # scripts/worldgen_fix.py
 import os
+import re
 import shutil
 import json
+import argparse
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from build_manifest import BuildManifest
+from build_stats import STATS, add_arguments, configure
+from json_output import JSON, add_arguments as add_json_arguments, configure as configure_json
+from themes import MOD_NS, VILLAGE_THEMES, group_themes_by_base, structure_id
 
-VILLAGE_THEMES = {
-    "cherry":        {"wood": "minecraft:cherry",   "stone": "deepslate", "base": "taiga"},
-    "birch":         {"wood": "minecraft:birch",    "stone": "diorite",   "base": "plains"},
-    "dark_oak":      {"wood": "minecraft:dark_oak", "stone": "granite",   "base": "savanna"},
-    "pale_oak":      {"wood": "minecraft:pale_oak", "stone": "andesite",  "base": "savanna"},
-    "bamboo_jungle": {"wood": "minecraft:bamboo",   "stone": "stone",     "base": "plains"},
-    "mangrove":      {"wood": "minecraft:mangrove", "stone": "stone",     "base": "plains"},
-    "beach":         {"wood": "morevillages:palm",  "stone": "sandstone", "base": "plains"},
-    "stony_shore":   {"wood": "minecraft:oak",      "stone": "andesite",  "base": "plains"},
-    "badlands":      {"wood": "minecraft:oak",      "stone": "granite",   "base": "desert"},
-    "ice_spikes":    {"wood": "minecraft:spruce",   "stone": "stone",     "base": "snowy"},
-}
+# bump when the rewrite rules change so every output is rebuilt
+SCRIPT_VERSION = 1
 
-MOD_NS = "morevillages"  # output namespace used for new structure references
+# template_pool trees are thousands of tiny files, so their IO is spread
+# over a few threads with a cap on how many files are queued at once
+IO_WORKERS = 8
+MAX_IN_FLIGHT = 32
 
 
 def replace_in_string(s: str, base: str, theme: str, mod_ns: str = MOD_NS) -> str:
@@ -40,62 +41,262 @@ def replace_in_string(s: str, base: str, theme: str, mod_ns: str = MOD_NS) -> st
     return s
 
 
+def _fits(a: str, b: str) -> bool:
+    """True if one of a, b is a prefix of the other."""
+    return a.startswith(b) or b.startswith(a)
+
+
+def _risky_inputs(rules, base: str, theme: str):
+    """
+    Regex fragments matching the inputs on which one leftmost scan over
+    `rules` could differ from applying them as sequential str.replace passes.
+    """
+    olds = [old for old, _ in rules]
+    news = [new for _, new in rules]
+    any_old = "(?:" + "|".join(re.escape(old) for old in olds) + ")"
+    fragments = []
+
+    for i, (early_old, early_new) in enumerate(rules):
+        for late_old, late_new in rules[i + 1:]:
+            # a later rule starting before an earlier one would win the scan
+            if early_old in late_old:
+                fragments.append(re.escape(late_old))
+                continue
+            for k in range(1, min(len(late_old), len(early_old))):
+                if not late_old.endswith(early_old[:k]):
+                    continue
+                # sharing exactly one <base> that both rules turn into <theme> is harmless ("/plains_")
+                shared_base = (
+                    k == len(base)
+                    and not any(early_old.endswith(early_old[:j]) for j in range(1, len(early_old)))
+                    and late_old.endswith(base) and late_new == late_old[:-k] + theme
+                    and early_old.startswith(base) and early_new == theme + early_old[k:]
+                )
+                if not shared_base:
+                    fragments.append(re.escape(late_old + early_old[k:]))
+
+            # a replacement that lets a later pass match across its edges,
+            # using input text or the replacement of a neighbouring match
+            if late_old in early_new or early_new in late_old:
+                fragments.append(re.escape(early_old))
+            for k in range(1, min(len(late_old), len(early_new) + 1)):
+                if late_old.endswith(early_new[:k]):
+                    before = late_old[:-k]
+                    fragments.append(re.escape(before + early_old))
+                    for m in range(1, len(before)):
+                        if any(_fits(new[::-1], before[:m][::-1]) for new in news):
+                            fragments.append(any_old + re.escape(before[m:] + early_old))
+                    if any(_fits(new[::-1], before[::-1]) for new in news):
+                        fragments.append(any_old + re.escape(early_old))
+                if early_new.endswith(late_old[:k]):
+                    after = late_old[k:]
+                    fragments.append(re.escape(early_old + after))
+                    for m in range(0, len(after)):
+                        if any(_fits(new, after[m:]) for new in news):
+                            fragments.append(re.escape(early_old + after[:m]) + any_old)
+    return fragments
+
+
+class StringRewriter:
+    """
+    Compiled, single-scan equivalent of replace_in_string for one (base, theme) pair.
+
+    The seven str.replace passes become one regex alternation with a dispatch
+    table, and results are cached since pools repeat the same ids constantly.
+    Strings on which pass order could matter (see _risky_inputs) still go
+    through replace_in_string, so the output is always identical; the
+    string_rewriter check in self_check.py compares the two.
+    """
+
+    def __init__(self, base: str, theme: str, mod_ns: str = MOD_NS):
+        self.base = base
+        self.theme = theme
+        self.mod_ns = mod_ns
+        rules = [
+            (f"minecraft:village/{base}", f"{mod_ns}:village/{theme}"),
+            (f"minecraft:village_{base}", f"{mod_ns}:village_{theme}"),
+            (f"village/{base}", f"{mod_ns}:village/{theme}"),
+            (f"village_{base}", f"village_{theme}"),
+            (f"{base}_", f"{theme}_"),
+            (f"/{base}/", f"/{theme}/"),
+            (f"/{base}", f"/{theme}"),
+        ]
+        self._table = dict(rules)
+        self._pattern = re.compile("|".join(re.escape(old) for old, _ in rules))
+        self._cache = {}
+
+        risky = _risky_inputs(rules, base, theme)
+        self._risky = re.compile("|".join(dict.fromkeys(risky))) if risky else None
+
+    def _dispatch(self, match):
+        return self._table[match.group(0)]
+
+    def __call__(self, s: str) -> str:
+        result = self._cache.get(s)
+        if result is None:
+            if not (self._risky and self._risky.search(s)):
+                result = self._pattern.sub(self._dispatch, s)
+            else:
+                result = replace_in_string(s, self.base, self.theme, self.mod_ns)
+            self._cache[s] = result
+        return result
+
+
+@lru_cache(maxsize=None)
+def compile_rewriter(base: str, theme: str, mod_ns: str = MOD_NS) -> StringRewriter:
+    """Build (once) the StringRewriter for a (base, theme) pair."""
+    return StringRewriter(base, theme, mod_ns)
+
+
 def recursive_replace(obj, base: str, theme: str):
-    """Recursively walk JSON-like object and replace strings using replace_in_string."""
+    """Recursively walk JSON-like object and replace strings using the compiled rewriter."""
+    return _rewrite(obj, compile_rewriter(base, theme))
+
+
+def _rewrite(obj, rewrite):
     if isinstance(obj, str):
-        return replace_in_string(obj, base, theme)
+        return rewrite(obj)
     if isinstance(obj, list):
-        return [recursive_replace(x, base, theme) for x in obj]
+        return [_rewrite(x, rewrite) for x in obj]
     if isinstance(obj, dict):
-        new = {}
-        for k, v in obj.items():
-            # replace in keys only if keys themselves contain strings referencing base (rare)
-            new_key = replace_in_string(k, base, theme) if isinstance(k, str) else k
-            new[new_key] = recursive_replace(v, base, theme)
-        return new
+        # replace in keys too, in case they reference base (rare)
+        return {rewrite(k) if isinstance(k, str) else k: _rewrite(v, rewrite) for k, v in obj.items()}
     return obj
 
 
-def copy_and_rename_pool(in_pool: str, out_pool: str, base: str, theme: str):
+def _fan_out_file(src, base, outputs):
+    """
+    Read one pool file, then write its renamed/rewritten copy for every
+    (theme, dest) in outputs. Runs on an IO thread; returns the dests written.
+    """
+    written = []
+    is_json = src.lower().endswith(".json")
+    data = raw = None
+    for theme, dest in outputs:
+        event = {}
+        try:
+            if is_json:
+                # the first theme pays for reading and parsing the source
+                if data is None:
+                    with STATS.time(theme, "load", event):
+                        with open(src, "r", encoding="utf-8") as fh:
+                            data = json.load(fh)
+                with STATS.time(theme, "transform", event):
+                    new_data = recursive_replace(data, base, theme)
+                with STATS.time(theme, "save", event):
+                    JSON.write(dest, new_data)
+            else:
+                if raw is None:
+                    with STATS.time(theme, "load", event):
+                        with open(src, "rb") as fh:
+                            raw = fh.read()
+                with STATS.time(theme, "save", event):
+                    with open(dest, "wb") as fh:
+                        fh.write(raw)
+                shutil.copystat(src, dest)
+        except Exception as e:
+            STATS.warn(f"Failed to process {dest}: {e}")
+            continue
+        written.append(dest)
+
+        bytes_in, bytes_out = os.path.getsize(src), os.path.getsize(dest)
+        STATS.count(theme, files=1, bytes_in=bytes_in, bytes_out=bytes_out)
+        STATS.trace(script="village_worldgen", theme=theme, file=dest,
+                    bytes_in=bytes_in, bytes_out=bytes_out, **event)
+        STATS.log(f"  Wrote {dest}")
+    return written
+
+
+def fan_out_pool(in_pool: str, base: str, targets, manifest=None, workers=IO_WORKERS):
+    """
+    Copy a template_pool folder (in_pool) into one out_pool per theme.
+    targets: list of (theme, out_pool) pairs sharing `base`
+    Each source file is read (and each JSON parsed) once, then renamed and
+    rewritten for every theme. With a BuildManifest, outputs that are already
+    up to date are skipped instead of wiping and recopying the whole folder.
+
+    Files are handled on `workers` IO threads (1 = inline), with at most
+    MAX_IN_FLIGHT files queued; the manifest is only touched on this thread.
+    """
+    for theme, out_pool in targets:
+        if (manifest is None or manifest.fresh_start) and os.path.exists(out_pool):
+            shutil.rmtree(out_pool)
+
+    def finish(src, written):
+        if manifest is not None:
+            for dest in written:
+                manifest.record(dest, [src], params_for[dest])
+
+    params_for = {}
+    pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    in_flight = {}
+    try:
+        for root, dirs, files in os.walk(in_pool):
+            rel = os.path.relpath(root, in_pool)
+            for fname in files:
+                src = os.path.join(root, fname)
+                outputs = []
+                for theme, out_pool in targets:
+                    params = {"base": base, "theme": theme, "mod_ns": MOD_NS, "json": JSON.mode}
+                    dest_root = os.path.join(out_pool, rel) if rel != "." else out_pool
+                    dest = os.path.join(dest_root, fname.replace(base, theme))
+                    if manifest is not None and manifest.is_fresh(dest, [src], params):
+                        continue
+                    os.makedirs(dest_root, exist_ok=True)
+                    params_for[dest] = params
+                    outputs.append((theme, dest))
+                if not outputs:
+                    continue
+
+                if pool is None:
+                    finish(src, _fan_out_file(src, base, outputs))
+                    continue
+                if len(in_flight) >= MAX_IN_FLIGHT:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finish(in_flight.pop(future), future.result())
+                in_flight[pool.submit(_fan_out_file, src, base, outputs)] = src
+
+        for future in list(in_flight):
+            finish(in_flight.pop(future), future.result())
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def copy_and_rename_pool(in_pool: str, out_pool: str, base: str, theme: str, manifest=None, workers=IO_WORKERS):
     """
     Copy a template_pool folder (in_pool) to out_pool.
     Rename files and replace internal JSON references.
     """
-    if os.path.exists(out_pool):
-        shutil.rmtree(out_pool)
-    for root, dirs, files in os.walk(in_pool):
-        rel = os.path.relpath(root, in_pool)
-        dest_root = os.path.join(out_pool, rel) if rel != "." else out_pool
-        os.makedirs(dest_root, exist_ok=True)
-        for fname in files:
-            src = os.path.join(root, fname)
-            new_fname = fname.replace(base, theme)
-            dest = os.path.join(dest_root, new_fname)
-            shutil.copy2(src, dest)
-
-            # If JSON, load and recursively replace string tokens inside
-            if dest.lower().endswith(".json"):
-                try:
-                    with open(dest, "r", encoding="utf-8") as fh:
-                        data = json.load(fh)
-                    data = recursive_replace(data, base, theme)
-                    with open(dest, "w", encoding="utf-8") as fh:
-                        json.dump(data, fh, indent=2)
-                except Exception as e:
-                    print(f"Warning: failed to process JSON {dest}: {e}")
-
-
-def copy_and_fix_structure_json(in_struct: str, out_struct: str, base: str, theme: str):
-    """Load a structure JSON, recursively replace strings, and write to out_struct."""
-    with open(in_struct, "r", encoding="utf-8") as fh:
-        data = json.load(fh)
+    fan_out_pool(in_pool, base, [(theme, out_pool)], manifest, workers)
+
+
+def copy_and_fix_structure_json(in_struct: str, out_struct: str, base: str, theme: str, data=None):
+    """Load a structure JSON (unless already parsed), recursively replace strings, and write to out_struct."""
+    if data is None:
+        with open(in_struct, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
     data = recursive_replace(data, base, theme)
     os.makedirs(os.path.dirname(out_struct), exist_ok=True)
-    with open(out_struct, "w", encoding="utf-8") as fh:
-        json.dump(data, fh, indent=2)
+    JSON.write(out_struct, data)
 
 
-def reskin_worldgen(base_dir="./data/minecraft", out_dir="./data/morevillages"):
+def add_structure_set_entries(villages_set):
+    """Add a weight-1 entry for every theme's village structure to a villages.json structure_set."""
+    if "structures" not in villages_set:
+        villages_set["structures"] = []
+    for theme in VILLAGE_THEMES:
+        new_struct_id = structure_id(theme)
+        if not any(s.get("structure") == new_struct_id for s in villages_set["structures"]):
+            villages_set["structures"].append({"structure": new_struct_id, "weight": 1})
+            STATS.log(f"  Added structure_set entry: {new_struct_id}")
+        else:
+            STATS.log(f"  structure_set already contains {new_struct_id}")
+    return villages_set
+
+
+def reskin_worldgen(base_dir="./data/minecraft", out_dir="./data/morevillages", workers=IO_WORKERS):
     struct_dir = os.path.join("worldgen", "structure")
     pool_dir = os.path.join("worldgen", "template_pool", "village")
     set_path = os.path.join("worldgen", "structure_set", "villages.json")
@@ -108,50 +309,74 @@ def reskin_worldgen(base_dir="./data/minecraft", out_dir="./data/morevillages"):
     out_pool_dir = os.path.join(out_dir, pool_dir)
     out_set_path = os.path.join(out_dir, set_path)
 
-    # copy villages.json (structure_set) and load it
-    os.makedirs(os.path.dirname(out_set_path), exist_ok=True)
-    shutil.copy2(base_set_path, out_set_path)
-    with open(out_set_path, "r", encoding="utf-8") as fh:
+    # only rewrite outputs whose input or theme changed since the last run
+    manifest = BuildManifest(os.path.join(out_dir, "worldgen"), SCRIPT_VERSION)
+
+    # load villages.json (structure_set)
+    with open(base_set_path, "r", encoding="utf-8") as fh:
         villages_set = json.load(fh)
 
-    for theme, mats in VILLAGE_THEMES.items():
-        base = mats["base"]
-        print(f"\nProcessing theme: {theme}  (base: {base})")
+    for base, themes in group_themes_by_base(VILLAGE_THEMES).items():
+        STATS.log(f"\nProcessing base: {base}  (themes: {', '.join(themes)})")
 
-        # 1) structure JSON (village_<base>.json -> village_<theme>.json)
+        # 1) structure JSON (village_<base>.json -> village_<theme>.json), parsed once per base
         in_struct = os.path.join(base_struct_dir, f"village_{base}.json")
-        out_struct = os.path.join(out_struct_dir, f"village_{theme}.json")
-        if not os.path.exists(in_struct):
-            print(f"  Skipping structure JSON (not found): {in_struct}")
-        else:
-            copy_and_fix_structure_json(in_struct, out_struct, base, theme)
-            print(f"  Wrote structure JSON: {out_struct}")
+        struct_data = None
+        for theme in themes:
+            out_struct = os.path.join(out_struct_dir, f"village_{theme}.json")
+            struct_params = {"base": base, "theme": theme, "mod_ns": MOD_NS, "json": JSON.mode}
+            if not os.path.exists(in_struct):
+                STATS.warn(f"Skipping structure JSON (not found): {in_struct}")
+            elif manifest.is_fresh(out_struct, [in_struct], struct_params):
+                STATS.log(f"  Structure JSON up to date: {out_struct}")
+            else:
+                if struct_data is None:
+                    with STATS.time(theme, "load"), open(in_struct, "r", encoding="utf-8") as fh:
+                        struct_data = json.load(fh)
+                with STATS.time(theme, "transform"):
+                    copy_and_fix_structure_json(in_struct, out_struct, base, theme, struct_data)
+                manifest.record(out_struct, [in_struct], struct_params)
+                STATS.count(theme, files=1, bytes_in=os.path.getsize(in_struct),
+                            bytes_out=os.path.getsize(out_struct))
+                STATS.log(f"  Wrote structure JSON: {out_struct}")
 
-        # 2) template_pool folder
+        # 2) template_pool folder, walked once per base
         in_pool = os.path.join(base_pool_dir, base)
-        out_pool = os.path.join(out_pool_dir, theme)
         if not os.path.exists(in_pool):
-            print(f"  Skipping template pool (not found): {in_pool}")
+            STATS.warn(f"Skipping template pool (not found): {in_pool}")
         else:
-            copy_and_rename_pool(in_pool, out_pool, base, theme)
-            print(f"  Copied and renamed pool folder: {out_pool}")
+            targets = [(theme, os.path.join(out_pool_dir, theme)) for theme in themes]
+            fan_out_pool(in_pool, base, targets, manifest, workers)
+            for _, out_pool in targets:
+                STATS.log(f"  Copied and renamed pool folder: {out_pool}")
 
-        # 3) add entry to villages.json
-        new_struct_id = f"{MOD_NS}:village_{theme}"
-        if "structures" not in villages_set:
-            villages_set["structures"] = []
-        if not any(s.get("structure") == new_struct_id for s in villages_set["structures"]):
-            villages_set["structures"].append({"structure": new_struct_id, "weight": 1})
-            print(f"  Added structure_set entry: {new_struct_id}")
-        else:
-            print(f"  structure_set already contains {new_struct_id}")
+    # 3) add entries to villages.json
+    add_structure_set_entries(villages_set)
 
     # Save updated villages.json
-    with open(out_set_path, "w", encoding="utf-8") as fh:
-        json.dump(villages_set, fh, indent=2)
+    set_params = {"themes": list(VILLAGE_THEMES), "mod_ns": MOD_NS, "json": JSON.mode}
+    if not manifest.is_fresh(out_set_path, [base_set_path], set_params):
+        os.makedirs(os.path.dirname(out_set_path), exist_ok=True)
+        JSON.write(out_set_path, villages_set)
+        manifest.record(out_set_path, [base_set_path], set_params)
+
+    for path in manifest.prune():
+        print(f"Removed orphan: {path}")
+    manifest.save()
     print("\n✅ worldgen JSONs generated/updated at:", os.path.abspath(out_dir))
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate themed worldgen JSONs for every village theme")
+    parser.add_argument("--io-workers", type=int, default=IO_WORKERS,
+                        help=f"threads for template_pool file IO (default: {IO_WORKERS}, 1 = inline)")
+    add_arguments(parser)
+    add_json_arguments(parser)
+    args = parser.parse_args()
+    configure(args.verbose, args.trace)
+    configure_json(args.compact, args.json_report)
+
     # Run the fixer: adjust base_dir/out_dir as needed
-    reskin_worldgen(base_dir="./data/minecraft", out_dir="./data/morevillages")
+    reskin_worldgen(base_dir="./data/minecraft", out_dir="./data/morevillages", workers=args.io_workers)
+    STATS.report("Worldgen")
+    JSON.report()